@@ -4,7 +4,7 @@ from functools import lru_cache
 
 class Settings(BaseSettings):
     # GitHub settings
-    GITHUB_TOKEN: str
+    GITHUB_TOKEN: Optional[str] = None
     GITHUB_API_VERSION: str = "2022-11-28"
     
     # OpenAI settings
@@ -16,6 +16,28 @@ class Settings(BaseSettings):
     # API settings
     API_TIMEOUT: int = 60
     MAX_FILES_PER_REQUEST: int = 5
+    GITHUB_FETCH_CONCURRENCY: int = 5
+
+    # Files are packed into OpenAI requests of at most this many prompt tokens,
+    # and up to ANALYSIS_CONCURRENCY of those requests run at once
+    ANALYSIS_BATCH_TOKENS: int = 6000
+    ANALYSIS_CONCURRENCY: int = 4
+
+    # Per-file code analysis cache (SQLite)
+    ANALYSIS_CACHE_PATH: str = ".cache/analyses.sqlite3"
+    ANALYSIS_CACHE_TTL: int = 7 * 24 * 3600
+
+    # Background matching jobs, shared through SQLite by every worker process on the host
+    JOB_STORE_PATH: str = ".cache/jobs.sqlite3"
+    JOB_WORKERS: int = 2
+    JOB_MAX_QUEUED: int = 100
+    JOB_RETENTION: int = 3600  # Seconds a finished job's result stays available
+
+    # Shared HTTP connection pools
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_CONNECTIONS_PER_HOST: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP2_ENABLED: bool = False
 
     class Config:
         env_file = ".env"
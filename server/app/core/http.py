@@ -0,0 +1,48 @@
+from typing import Optional
+import aiohttp
+import httpx
+from fastapi import Request
+from app.core.config import Settings
+from model.config import CONFIG
+from model.http_cache import HTTPCache
+
+class HTTPClients:
+    """
+    Long-lived connection pools shared by every request in a worker.
+
+    - github: aiohttp session with per-host limits, used for raw file downloads
+    - api: httpx client (optionally HTTP/2) for the LLM endpoint and GitHub fetches
+      made by the prompts router
+    - cache: conditional-GET cache for raw file downloads, used by both routers
+    """
+    def __init__(self, settings: Settings):
+        self.github = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=settings.HTTP_MAX_CONNECTIONS,
+                limit_per_host=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_EXPIRY,
+                ttl_dns_cache=300,
+            ),
+        )
+        self.api = httpx.AsyncClient(
+            http2=settings.HTTP2_ENABLED,  # Needs the optional `h2` package
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_MAX_CONNECTIONS_PER_HOST,
+                keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=settings.API_TIMEOUT,
+        )
+        self.cache = HTTPCache(CONFIG['HTTP_CACHE_DIR'], CONFIG['HTTP_CACHE_MAX_BYTES']) if CONFIG['HTTP_CACHE_DIR'] else None
+
+    async def close(self):
+        await self.github.close()
+        await self.api.aclose()
+
+def get_api_client(request: Request) -> httpx.AsyncClient:
+    """Return the shared httpx client created in app.main's lifespan"""
+    return request.app.state.http.api
+
+def get_http_cache(request: Request) -> Optional[HTTPCache]:
+    """Return the shared download cache, or None when it is disabled"""
+    return request.app.state.http.cache
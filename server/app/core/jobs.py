@@ -0,0 +1,352 @@
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional
+from fastapi import Request
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+class Job:
+    """One submitted unit of work and everything a client can poll about it"""
+    def __init__(self, kind: str, payload: Any = None, **fields):
+        self.id = fields.get("id") or uuid.uuid4().hex
+        self.kind = kind
+        self.payload = payload
+        self.status = fields.get("status", QUEUED)
+        self.progress: Dict[str, Dict[str, int]] = fields.get("progress") or {}
+        self.result = fields.get("result")
+        self.error: Optional[str] = fields.get("error")
+        self.created_at = fields.get("created_at") or time.time()
+        self.started_at: Optional[float] = fields.get("started_at")
+        self.finished_at: Optional[float] = fields.get("finished_at")
+        self.task: Optional[asyncio.Task] = None
+        self.cancel_requested = False
+
+    def report(self, stage: str, done: int, total: int):
+        """Progress callback handed to the work function"""
+        self.progress[stage] = {"done": done, "total": total}
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "progress": self.progress,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class JobStore:
+    """
+    Where jobs live between submission and expiry. Every API process that shares a
+    store can run its queued jobs and answer polls for any of them, and the jobs
+    outlive the process that accepted them.
+
+    `worker` identifies the JobManager that claimed a job, so only its runner can
+    finish it or keep it alive.
+    """
+    def add(self, job: Job, max_queued: int) -> bool:
+        """Store a queued job; False when `max_queued` jobs are already waiting"""
+        raise NotImplementedError
+
+    def claim(self, worker: str, stale_before: float) -> Optional[Job]:
+        """Mark the oldest queued job (or a running one whose heartbeat is older than
+        `stale_before`) as running for `worker` and return it"""
+        raise NotImplementedError
+
+    def get(self, job_id: str) -> Optional[Job]:
+        raise NotImplementedError
+
+    def heartbeat(self, worker: str, progress: Dict[str, str]) -> set:
+        """Record the JSON progress of `worker`'s running jobs; returns the ids asked to cancel"""
+        raise NotImplementedError
+
+    def finish(self, job_id: str, worker: str, status: str, progress: str, result: Any = None, error: Optional[str] = None):
+        raise NotImplementedError
+
+    def requeue(self, job_id: str, worker: str):
+        """Hand a job interrupted by shutdown back to the queue"""
+        raise NotImplementedError
+
+    def cancel(self, job_id: str):
+        """Cancel a queued job now, or ask the worker running it to stop"""
+        raise NotImplementedError
+
+    def purge(self, finished_before: float):
+        raise NotImplementedError
+
+class SQLiteJobStore(JobStore):
+    """
+    JobStore in a SQLite file, shared by every worker process on the host the same
+    way PersistentCache is. ":memory:" gives a store private to one process.
+    """
+    COLUMNS = ("id", "kind", "payload", "status", "progress", "result", "error", "created_at", "started_at", "finished_at")
+
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.lock = threading.Lock()  # One connection shared by the worker's threads
+        self.conn = sqlite3.connect(
+            path,
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None,  # Transactions are managed explicitly in add and claim
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT, status TEXT NOT NULL,
+                progress TEXT, result TEXT, error TEXT,
+                created_at REAL NOT NULL, started_at REAL, finished_at REAL,
+                worker TEXT, heartbeat REAL, cancel_requested INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at)")
+
+    def _job(self, row) -> Optional[Job]:
+        if row is None:
+            return None
+        fields = dict(zip(self.COLUMNS, row))
+        for name in ("payload", "progress", "result"):
+            if fields[name] is not None:
+                fields[name] = json.loads(fields[name])
+        return Job(fields.pop("kind"), fields.pop("payload"), **fields)
+
+    def _select(self, where, params=()):
+        return self.conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs WHERE {where}", params).fetchone()
+
+    def add(self, job, max_queued):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")  # Count and insert as one step across processes
+            try:
+                queued = self.conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= max_queued:
+                    self.conn.execute("ROLLBACK")
+                    return False
+                self.conn.execute(
+                    "INSERT INTO jobs (id, kind, payload, status, progress, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (job.id, job.kind, json.dumps(job.payload), job.status, json.dumps(job.progress), job.created_at)
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        return True
+
+    def claim(self, worker, stale_before):
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")  # Exclusive claim across processes
+            try:
+                # Cancellation was requested from a worker that has since died
+                self.conn.execute(
+                    "UPDATE jobs SET status = ?, finished_at = ?, payload = NULL "
+                    "WHERE status = ? AND heartbeat < ? AND cancel_requested = 1",
+                    (CANCELLED, now, RUNNING, stale_before)
+                )
+                row = self._select(
+                    "status = ? OR (status = ? AND heartbeat < ?) ORDER BY created_at LIMIT 1",
+                    (QUEUED, RUNNING, stale_before)
+                )
+                if row is not None:
+                    self.conn.execute(
+                        "UPDATE jobs SET status = ?, worker = ?, started_at = ?, heartbeat = ? WHERE id = ?",
+                        (RUNNING, worker, now, now, row[0])
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+        job = self._job(row)
+        if job is not None:
+            job.status, job.started_at = RUNNING, now
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self._job(self._select("id = ?", (job_id,)))
+
+    def heartbeat(self, worker, progress):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "UPDATE jobs SET progress = ?, heartbeat = ? WHERE id = ? AND worker = ? AND status = ?",
+                ((job_progress, now, job_id, worker, RUNNING) for job_id, job_progress in progress.items())
+            )
+            rows = self.conn.execute(
+                "SELECT id FROM jobs WHERE worker = ? AND status = ? AND cancel_requested = 1", (worker, RUNNING)
+            )
+            return {job_id for (job_id,) in rows}
+
+    def finish(self, job_id, worker, status, progress, result=None, error=None):
+        with self.lock:
+            # A runner whose job was requeued after it stalled no longer owns it
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, progress = ?, result = ?, error = ?, finished_at = ?, payload = NULL "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (status, progress, json.dumps(result), error, time.time(), job_id, worker, RUNNING)
+            )
+
+    def requeue(self, job_id, worker):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, worker = NULL, started_at = NULL, heartbeat = NULL "
+                "WHERE id = ? AND worker = ? AND status = ?",
+                (QUEUED, job_id, worker, RUNNING)
+            )
+
+    def cancel(self, job_id):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, payload = NULL WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED)
+            )
+            self.conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING))
+
+    def purge(self, finished_before):
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE finished_at < ?", (finished_before,))
+
+class JobManager:
+    """
+    Job queue served by a fixed pool of worker tasks, so long matching runs happen
+    outside the HTTP request that submitted them.
+
+    Jobs are kept in `store` as their kind plus a JSON payload, and `handlers[kind]`
+    (payload, job) does the work, so with a shared store any API process can run a job
+    that another one accepted, and queued or interrupted jobs survive a restart.
+    submit raises asyncio.QueueFull once `max_queued` jobs are waiting; at most
+    `workers` run at a time in this process, and results are kept for `retention`
+    seconds after they finish.
+    """
+    POLL_INTERVAL = 0.5  # Seconds between looks for jobs submitted by other processes
+    HEARTBEAT_INTERVAL = 1.0  # Seconds between progress writes for running jobs
+    STALE_AFTER = 30.0  # A running job without a heartbeat for this long is run again
+
+    def __init__(
+        self,
+        handlers: Dict[str, Callable[[Any, Job], Awaitable[Any]]],
+        store: JobStore,
+        workers: int = 2,
+        max_queued: int = 100,
+        retention: float = 3600
+    ):
+        self.handlers = handlers
+        self.store = store
+        self.workers = workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.running: Dict[str, Job] = {}
+        self._wake = asyncio.Event()
+        self._workers = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._workers.append(asyncio.create_task(self._heartbeat()))
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        # Whatever was interrupted runs again on the next worker to claim it
+        for job_id in list(self.running):
+            await asyncio.to_thread(self.store.requeue, job_id, self.worker_id)
+        self.running.clear()
+
+    async def submit(self, kind: str, payload: Any) -> Job:
+        """Queue `handlers[kind](payload, job)`; its return value becomes the job's result"""
+        await self._purge()
+        job = Job(kind, payload)
+        if not await asyncio.to_thread(self.store.add, job, self.max_queued):
+            raise asyncio.QueueFull()
+        self._wake.set()
+        return job
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        await self._purge()
+        return self.running.get(job_id) or await asyncio.to_thread(self.store.get, job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancel a queued or running job; finished jobs are left as they are"""
+        job = self.running.get(job_id)
+        if job is not None:
+            job.cancel_requested = True
+            job.task.cancel()
+            return job
+        # Queued, or running in another process, which notices on its next heartbeat
+        await asyncio.to_thread(self.store.cancel, job_id)
+        return await self.get(job_id)
+
+    async def _purge(self):
+        await asyncio.to_thread(self.store.purge, time.time() - self.retention)
+
+    async def _worker(self):
+        while True:
+            self._wake.clear()
+            job = await asyncio.to_thread(self.store.claim, self.worker_id, time.time() - self.STALE_AFTER)
+            if job is None:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.HEARTBEAT_INTERVAL)
+            if not self.running:
+                continue
+            progress = {job_id: json.dumps(job.progress) for job_id, job in self.running.items()}
+            for job_id in await asyncio.to_thread(self.store.heartbeat, self.worker_id, progress):
+                job = self.running.get(job_id)
+                if job is not None and job.task is not None:
+                    job.cancel_requested = True
+                    job.task.cancel()
+
+    async def _run(self, job: Job):
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            await self._finish(job, FAILED, error=f"No handler for {job.kind} jobs")
+            return
+        self.running[job.id] = job
+        job.task = asyncio.create_task(handler(job.payload, job))
+        try:
+            result = await job.task
+        except asyncio.CancelledError:
+            if not job.cancel_requested:
+                raise  # The worker itself is shutting down; close() requeues the job
+            await self._finish(job, CANCELLED)
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            await self._finish(job, FAILED, error=str(e))
+        else:
+            await self._finish(job, SUCCEEDED, result=result)
+
+    async def _finish(self, job: Job, status: str, result=None, error: Optional[str] = None):
+        await asyncio.to_thread(
+            self.store.finish, job.id, self.worker_id, status, json.dumps(job.progress), result, error
+        )
+        self.running.pop(job.id, None)
+        job.status, job.result, job.error = status, result, error
+        job.finished_at = time.time()
+        job.payload = job.task = None
+
+def get_jobs(request: Request) -> JobManager:
+    """Return the job manager started in app.main's lifespan"""
+    return request.app.state.jobs
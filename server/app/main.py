@@ -1,11 +1,50 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import models#,prompts
+from fastapi.responses import JSONResponse
+from openai import AsyncOpenAI
+from app.core.config import get_settings
+from app.core.http import HTTPClients
+from app.core.jobs import JobManager, SQLiteJobStore
+from app.routers import jobs, models#,prompts
+from app.routers.jobs import job_handlers
+from model.matcher import IssueMatcher
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # One matcher (and model, or embedding worker pool) and one set of connection pools per
+    # API worker process, shared by every request it serves; nothing here is shared across them
+    app.state.ready = False
+    settings = get_settings()
+    app.state.http = HTTPClients(settings)
+    app.state.matcher = IssueMatcher(
+        session=app.state.http.github,
+        http_cache=app.state.http.cache,
+        llm_client=AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=app.state.http.api),
+    )
+    app.state.jobs = JobManager(
+        job_handlers(app.state.matcher),
+        SQLiteJobStore(settings.JOB_STORE_PATH),
+        settings.JOB_WORKERS,
+        settings.JOB_MAX_QUEUED,
+        settings.JOB_RETENTION,
+    )
+    await asyncio.to_thread(app.state.matcher.embedding_generator.warm_up)
+    if app.state.matcher.reranker is not None:
+        await asyncio.to_thread(app.state.matcher.reranker.warm_up)
+    app.state.jobs.start()
+    app.state.ready = True
+    yield
+    await app.state.jobs.close()
+    await app.state.http.close()
+    await asyncio.to_thread(app.state.matcher.embedding_generator.close)
 
 app = FastAPI(
     title="TinkHack",
     description="...",
     version="1.0.0",
+    lifespan=lifespan,
 )
 # CORS setup
 origins = [
@@ -22,6 +61,7 @@ app.add_middleware(
 
 # Include routers
 app.include_router(models.router, prefix="/api/models", tags=["Models"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["Jobs"])
 #app.include_router(prompts.router, prefix="/api/prompts", tags=["Prompts"])
 
 @app.get("/")
@@ -30,4 +70,6 @@ def read_root():
 
 @app.get("/health", tags=["Health"])
 def health_check():
-    return {"status": "Server is running!"}
\ No newline at end of file
+    if not getattr(app.state, "ready", False):
+        return JSONResponse(status_code=503, content={"status": "Model is loading"})
+    return {"status": "Server is running!"}
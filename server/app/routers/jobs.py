@@ -0,0 +1,74 @@
+import asyncio
+from typing import Dict
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from app.core.jobs import FAILED, SUCCEEDED, Job, JobManager, get_jobs
+from app.routers.models import check_batch, run_batch_match, run_match
+from app.schemas.model_schemas import BatchIssueAnalysisRequest, IssueAnalysisRequest
+from model.matcher import IssueMatcher
+
+router = APIRouter()
+
+async def submit(jobs: JobManager, kind: str, payload) -> JSONResponse:
+    """Queue a job and answer 202 with where to poll for it"""
+    try:
+        job = await jobs.submit(kind, payload)
+    except asyncio.QueueFull:
+        raise HTTPException(status_code=429, detail="Too many queued jobs, try again later")
+    return JSONResponse(status_code=202, content={**job.to_dict(), "status_url": f"/api/jobs/{job.id}"})
+
+async def get_job(job_id: str, jobs: JobManager) -> Job:
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return job
+
+def job_handlers(matcher: IssueMatcher) -> Dict:
+    """
+    Work for each job kind, rebuilt from the stored request so any process sharing the
+    job store can run it: progress goes to the job, error results fail it.
+    """
+    def handler(run, schema):
+        async def work(payload, job: Job):
+            result = await run(schema(**payload), matcher, progress=job.report)
+            if result.get("status") == "error":
+                raise RuntimeError(result["message"])
+            return result
+        return work
+
+    return {
+        "match-keywords": handler(run_match, IssueAnalysisRequest),
+        "match-keywords/batch": handler(run_batch_match, BatchIssueAnalysisRequest),
+    }
+
+@router.post("/match-keywords", status_code=202)
+async def submit_match(request: IssueAnalysisRequest, jobs: JobManager = Depends(get_jobs)):
+    """Queue /api/models/match-keywords as a background job"""
+    return await submit(jobs, "match-keywords", request.dict())
+
+@router.post("/match-keywords/batch", status_code=202)
+async def submit_batch_match(request: BatchIssueAnalysisRequest, jobs: JobManager = Depends(get_jobs)):
+    """Queue /api/models/match-keywords/batch as a background job"""
+    check_batch(request)
+    return await submit(jobs, "match-keywords/batch", request.dict())
+
+@router.get("/{job_id}")
+async def job_status(job_id: str, jobs: JobManager = Depends(get_jobs)):
+    """Status and per-stage progress of a job"""
+    return (await get_job(job_id, jobs)).to_dict()
+
+@router.get("/{job_id}/result")
+async def job_result(job_id: str, jobs: JobManager = Depends(get_jobs)):
+    """Result of a succeeded job; 409 while it is queued or running or if it was cancelled"""
+    job = await get_job(job_id, jobs)
+    if job.status == FAILED:
+        raise HTTPException(status_code=500, detail=f"Error analyzing issue: {job.error}")
+    if job.status != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return job.result
+
+@router.delete("/{job_id}")
+async def cancel_job(job_id: str, jobs: JobManager = Depends(get_jobs)):
+    """Cancel a queued or running job"""
+    await get_job(job_id, jobs)
+    return (await jobs.cancel(job_id)).to_dict()
@@ -1,32 +1,66 @@
-from fastapi import APIRouter, HTTPException
-from app.schemas.model_schemas import IssueAnalysisRequest, IssueAnalysisResponse
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.schemas.model_schemas import BatchIssueAnalysisRequest, BatchIssueAnalysisResponse, IssueAnalysisRequest, IssueAnalysisResponse
 from model.matcher import IssueMatcher
+import json
 import time
+from typing import Dict
 
 router = APIRouter()
 
+def get_matcher(request: Request) -> IssueMatcher:
+    """Return the matcher created at startup in app.main's lifespan"""
+    return request.app.state.matcher
+
+async def run_match(request: IssueAnalysisRequest, matcher: IssueMatcher, progress=None) -> Dict:
+    """Match one issue and add the request fields clients expect in the result"""
+    result = await matcher.match_files(
+        request.issueDetails.dict(),
+        [file.dict() for file in request.filteredFiles],
+        progress=progress
+    )
+
+    # Add additional fields to match test_run.py output
+    result["repo"] = request.issueDetails.repo
+    result["description"] = request.issueDetails.description
+    result["issuenum"] = request.issueDetails.issuenum
+    result["owner"] = request.issueDetails.owner
+    return result
+
+def check_batch(request: BatchIssueAnalysisRequest):
+    """Reject batches that are empty or mix repositories"""
+    if not request.issues:
+        raise HTTPException(status_code=400, detail="No issues to analyze")
+    if any((issue.owner, issue.repo) != (request.owner, request.repo) for issue in request.issues):
+        raise HTTPException(status_code=400, detail="All issues must belong to the requested repository")
+
+async def run_batch_match(request: BatchIssueAnalysisRequest, matcher: IssueMatcher, progress=None) -> Dict:
+    """Match a batch of issues and add the request fields clients expect in the result"""
+    result = await matcher.match_issues(
+        [issue.dict() for issue in request.issues],
+        [file.dict() for file in request.filteredFiles],
+        progress=progress
+    )
+    if result.get("status") == "error":
+        return result
+
+    for issue, issue_result in zip(request.issues, result["results"]):
+        issue_result["description"] = issue.description
+        issue_result["issuenum"] = issue.issuenum
+    result["repo"] = request.repo
+    result["owner"] = request.owner
+    return result
+
 @router.post("/match-keywords")
-async def analyze_issue(request: IssueAnalysisRequest):
+async def analyze_issue(request: IssueAnalysisRequest, matcher: IssueMatcher = Depends(get_matcher)):
     try:
-        # Initialize the matcher
-        matcher = IssueMatcher()
-        
         start_time = time.time()
         
         # Run the matching
-        result = await matcher.match_files(
-            request.issueDetails.dict(),
-            [file.dict() for file in request.filteredFiles]
-        )
+        result = await run_match(request, matcher)
         
         end_time = time.time()
         elapsed_time = end_time - start_time
-        
-        # Add additional fields to match test_run.py output
-        result["repo"] = request.issueDetails.repo
-        result["description"] = request.issueDetails.description
-        result["issuenum"] = request.issueDetails.issuenum
-        result["owner"] = request.issueDetails.owner
 
         return result
     
@@ -34,4 +68,38 @@ async def analyze_issue(request: IssueAnalysisRequest):
         raise HTTPException(
             status_code=500,
             detail=f"Error analyzing issue: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+@router.post("/match-keywords/batch", response_model=BatchIssueAnalysisResponse)
+async def analyze_issues(request: BatchIssueAnalysisRequest, matcher: IssueMatcher = Depends(get_matcher)):
+    """
+    Match many issues of one repository in a single call: the files are downloaded and
+    embedded once, and every issue gets its own top matches plus one shared overview.
+    """
+    check_batch(request)
+    try:
+        result = await run_batch_match(request, matcher)
+        if result.get("status") == "error":
+            raise RuntimeError(result["message"])
+        return result
+
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error analyzing issues: {str(e)}"
+        )
+
+@router.post("/match-keywords/stream")
+async def analyze_issue_stream(request: IssueAnalysisRequest, matcher: IssueMatcher = Depends(get_matcher)):
+    """
+    Same matching as /match-keywords, streamed as NDJSON: progress events per stage,
+    the file matches as soon as scoring finishes, then the overview when the LLM answers.
+    """
+    async def events():
+        async for event in matcher.match_files_events(
+            request.issueDetails.dict(),
+            [file.dict() for file in request.filteredFiles]
+        ):
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException, Body
+from fastapi import APIRouter, HTTPException, Body, Depends
 from fastapi.responses import JSONResponse
+import asyncio
+import hashlib
 import httpx
 import json
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel, HttpUrl, Field
 from app.core.config import get_settings
+from app.core.http import get_api_client, get_http_cache
+from model.cache import PersistentCache
+from model.http_cache import HTTPCache
+from model.llm_output import GraphResponseParser
+from model.tokens import count_tokens
+from functools import lru_cache
 import logging
 from tenacity import retry, stop_after_attempt, wait_exponential
 
@@ -58,6 +66,9 @@ Notes:
 - The "attributes" field can contain any relevant metadata for that component
 - Be accurate and precise in your analysis"""
 
+# Bump whenever SYSTEM_MESSAGE or the request format changes, so cached analyses are redone
+PROMPT_VERSION = 2
+
 router = APIRouter()
 
 # Models
@@ -71,12 +82,19 @@ class CodeAnalysisResponse(BaseModel):
     description: str
     graph: Dict[str, Dict[str, Any]]
 
+@lru_cache()
+def get_analysis_cache() -> PersistentCache:
+    """Per-file analysis cache shared by all requests"""
+    return PersistentCache(settings.ANALYSIS_CACHE_PATH, ttl=settings.ANALYSIS_CACHE_TTL)
+
 def get_github_headers():
-    return {
+    headers = {
         "Accept": "application/vnd.github+json",
-        "Authorization": f"Bearer {settings.GITHUB_TOKEN}",
         "X-GitHub-Api-Version": settings.GITHUB_API_VERSION
     }
+    if settings.GITHUB_TOKEN:
+        headers["Authorization"] = f"Bearer {settings.GITHUB_TOKEN}"
+    return headers
 
 def get_openai_headers():
     return {
@@ -84,8 +102,8 @@ def get_openai_headers():
         "Content-Type": "application/json"
     }
 
-async def fetch_code_from_github(file_url: str) -> str:
-    """Fetch code content from a GitHub file URL"""
+async def fetch_code_from_github(file_url: str, client: httpx.AsyncClient, http_cache: Optional[HTTPCache] = None) -> str:
+    """Fetch code content from a GitHub file URL, revalidating cached copies with a conditional GET"""
     try:
         # Process the URL to get raw content
         if "raw.githubusercontent.com" in file_url:
@@ -96,15 +114,22 @@ async def fetch_code_from_github(file_url: str) -> str:
             raw_url = raw_url.replace("/blob/", "/")
 
         logger.info(f"Fetching code from: {raw_url}")
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(raw_url, headers=get_github_headers(), timeout=30.0)
-            if response.status_code != 200:
-                logger.error(f"GitHub API error: {response.status_code} - {response.text}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=f"Failed to fetch code from GitHub: {response.text}"
-                )
-            return response.text
+        cached = await asyncio.to_thread(http_cache.get, raw_url) if http_cache else None
+        if cached and cached.get('truncated'):
+            cached = None  # The matcher kept only a prefix; a 304 must not stand in for the whole file
+        headers = {**get_github_headers(), **HTTPCache.conditional_headers(cached)}
+        response = await client.get(raw_url, headers=headers, timeout=30.0)
+        if response.status_code == 304 and cached:
+            return cached['body']
+        if response.status_code != 200:
+            logger.error(f"GitHub API error: {response.status_code} - {response.text}")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Failed to fetch code from GitHub: {response.text}"
+            )
+        if http_cache:
+            await asyncio.to_thread(http_cache.set, raw_url, response.headers, response.text)
+        return response.text
     except httpx.HTTPError as e:
         logger.error(f"GitHub API request failed: {str(e)}")
         raise HTTPException(
@@ -119,7 +144,7 @@ async def fetch_code_from_github(file_url: str) -> str:
         )
 
 @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
-async def analyze_code_with_openai(code_files: Dict[str, str]) -> Dict[str, Any]:
+async def analyze_code_with_openai(code_files: Dict[str, str], client: httpx.AsyncClient) -> Dict[str, Any]:
     """Send code to OpenAI for analysis with retries"""
     try:
         messages = [
@@ -129,93 +154,49 @@ async def analyze_code_with_openai(code_files: Dict[str, str]) -> Dict[str, Any]
         
         # Add each file to be analyzed
         for filename, code in code_files.items():
-            messages.append({"role": "user", "content": f"File: {filename}\n\n```\n{code}\n```"})
+            messages.append({"role": "user", "content": file_message(filename, code)})
         
         logger.info(f"Sending {len(code_files)} files to OpenAI for analysis")
-        async with httpx.AsyncClient(timeout=settings.API_TIMEOUT) as client:
-            response = await client.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=get_openai_headers(),
-                json={
-                    "model": settings.OPENAI_MODEL,
-                    "messages": messages,
-                    "temperature": 0.1,
-                    "max_tokens": settings.OPENAI_MAX_TOKENS
-                },
-                timeout=settings.API_TIMEOUT
-            )
-            
+        # Stream the completion so the graph is parsed while the rest is still generated
+        parser = GraphResponseParser()
+        received = False
+        async with client.stream(
+            "POST",
+            "https://api.openai.com/v1/chat/completions",
+            headers=get_openai_headers(),
+            json={
+                "model": settings.OPENAI_MODEL,
+                "messages": messages,
+                "temperature": 0.1,
+                "max_tokens": settings.OPENAI_MAX_TOKENS,
+                "stream": True
+            },
+            timeout=settings.API_TIMEOUT
+        ) as response:
             if response.status_code != 200:
-                logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+                body = (await response.aread()).decode(errors="replace")
+                logger.error(f"OpenAI API error: {response.status_code} - {body}")
                 raise HTTPException(
                     status_code=response.status_code,
-                    detail=f"OpenAI API error: {response.text}"
+                    detail=f"OpenAI API error: {body}"
                 )
-            
-            result = response.json()
-            if "choices" not in result or not result["choices"]:
-                logger.error("Invalid response structure from OpenAI")
-                raise HTTPException(
-                    status_code=500,
-                    detail="Invalid response from OpenAI API"
-                )
-                
-            full_response = result["choices"][0]["message"]["content"]
-            
-            if not full_response:
-                logger.warning("Empty response from OpenAI")
-                return {"description": "No analysis available", "graph": {}}
 
-            # Extract the JSON graph data
             try:
-                # Find the JSON markers
-                json_start = full_response.find("---JSON_GRAPH---")
-                json_end = full_response.find("---JSON_END---")
-                
-                if json_start == -1 or json_end == -1:
-                    logger.warning("Missing JSON markers in response")
-                    raise ValueError("Missing JSON markers in response")
-                
-                # Extract the JSON string
-                json_str = full_response[json_start + 15:json_end].strip()
-                
-                # Clean up potential issues in the JSON string
-                json_str = json_str.replace("```json", "").replace("```", "")
-                # Remove comments that might have been added
-                json_str = '\n'.join([line for line in json_str.split('\n') if not line.strip().startswith('//')])
-                
-                # Parse and validate JSON
-                if not json_str:
-                    logger.warning("Empty JSON structure")
-                    raise ValueError("Empty JSON structure")
-                
-                try:
-                    graph = json.loads(json_str)
-                except json.JSONDecodeError:
-                    # Try to fix common JSON issues and try again
-                    logger.warning("Initial JSON parsing failed, attempting to fix format")
-                    # Replace single quotes with double quotes
-                    json_str = json_str.replace("'", "\"")
-                    # Remove trailing commas
-                    json_str = json_str.replace(",\n}", "\n}")
-                    json_str = json_str.replace(",\n]", "\n]")
-                    graph = json.loads(json_str)
-                
-                # Extract description
-                desc_start = full_response.find("---DESCRIPTION---")
-                desc_end = full_response.find("---DESCRIPTION_END---")
-                
-                description = (full_response[desc_start + 16:desc_end].strip() 
-                             if desc_start != -1 and desc_end != -1 
-                             else "No description available")
-                
-                return {
-                    "description": description,
-                    "graph": graph
-                }
-                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == "[DONE]":
+                        break
+                    choices = json.loads(data).get("choices")
+                    content = choices[0].get("delta", {}).get("content") if choices else None
+                    if content:
+                        received = True
+                        parser.feed(content)
+                result = parser.close() if received else None
             except json.JSONDecodeError as e:
-                logger.error(f"JSON parsing error: {str(e)}, JSON string: {json_str[:200]}...")
+                # Malformed even after local repair; retrying the paid request rarely helps
+                logger.error(f"JSON parsing error: {str(e)}")
                 return {
                     "description": "Error parsing analysis",
                     "graph": {"error": f"Invalid JSON structure: {str(e)}"}
@@ -226,7 +207,12 @@ async def analyze_code_with_openai(code_files: Dict[str, str]) -> Dict[str, Any]
                     "description": str(e),
                     "graph": {"error": "Invalid response format"}
                 }
-            
+
+        if not received:
+            logger.warning("Empty response from OpenAI")
+            return {"description": "No analysis available", "graph": {}}
+        return result
+        
     except httpx.TimeoutException:
         logger.error("OpenAI API request timed out")
         raise HTTPException(status_code=504, detail="Analysis request timed out")
@@ -234,28 +220,135 @@ async def analyze_code_with_openai(code_files: Dict[str, str]) -> Dict[str, Any]
         logger.error(f"Analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error analyzing code: {str(e)}")
 
+def analysis_cache_key(code: str) -> str:
+    """Cache key for one file's analysis: its content, the prompt version and the model"""
+    digest = hashlib.sha256(code.encode("utf-8", errors="replace")).hexdigest()
+    return f"analysis:v{PROMPT_VERSION}:{settings.OPENAI_MODEL}:{digest}"
+
+def file_message(filename: str, code: str) -> str:
+    """User message carrying one file to analyze"""
+    return f"File: {filename}\n\n```\n{code}\n```"
+
+def summarize_graph(filename: str, file_graph: Dict[str, Any]) -> str:
+    """One-line description of a cached file analysis that has no description of its own"""
+    components = ", ".join(
+        f"{len(items)} {kind}" for kind, items in file_graph.get("components", {}).items() if isinstance(items, list)
+    )
+    summary = f"{filename}: {file_graph.get('category', 'unknown')} ({file_graph.get('language', 'unknown')})"
+    return f"{summary} with {components}" if components else summary
+
+def batch_files(code_files: Dict[str, str], token_budget: int) -> List[Dict[str, str]]:
+    """
+    Pack files into batches whose messages total at most `token_budget` prompt tokens.
+    Files are taken largest first into the first batch with room; a file over the budget
+    on its own gets a batch to itself.
+    """
+    sizes = {filename: count_tokens(file_message(filename, code)) for filename, code in code_files.items()}
+    batches, room = [], []
+    for filename in sorted(code_files, key=sizes.get, reverse=True):
+        for i, left in enumerate(room):
+            if sizes[filename] <= left:
+                batches[i][filename] = code_files[filename]
+                room[i] -= sizes[filename]
+                break
+        else:
+            batches.append({filename: code_files[filename]})
+            room.append(token_budget - sizes[filename])
+    return batches
+
+async def analyze_with_cache(code_files: Dict[str, str], client: httpx.AsyncClient, cache: PersistentCache) -> Dict[str, Any]:
+    """
+    Analyze files, reusing cached per-file graphs so only new or changed files go to OpenAI.
+    Uncached files are split into token-budgeted batches analyzed concurrently; each batch is
+    retried on its own and its per-file results are cached as soon as it completes.
+
+    A batch's description covers all of its files, so it is only cached with the graph of a
+    file analyzed alone. Cached files without one are summarized from their graph.
+    """
+    keys = {filename: analysis_cache_key(code) for filename, code in code_files.items()}
+    cached = {}
+    for filename, key in keys.items():
+        entry = await asyncio.to_thread(cache.get, key)
+        if entry is not None:
+            cached[filename] = entry
+
+    graph = {filename: entry["graph"] for filename, entry in cached.items()}
+    descriptions = [
+        entry["description"] or summarize_graph(filename, entry["graph"])
+        for filename, entry in cached.items()
+    ]
+
+    pending = {filename: code for filename, code in code_files.items() if filename not in cached}
+    if not pending:
+        return {
+            "description": "\n\n".join(dict.fromkeys(descriptions)),
+            "graph": graph
+        }
+
+    batches = batch_files(pending, settings.ANALYSIS_BATCH_TOKENS)
+    logger.info(f"Analysis cache: {len(cached)} hits, {len(pending)} files to analyze in {len(batches)} batches")
+    semaphore = asyncio.Semaphore(settings.ANALYSIS_CONCURRENCY)
+
+    async def analyze_batch(batch):
+        async with semaphore:
+            analysis = await analyze_code_with_openai(batch, client)
+        batch_graph = analysis["graph"]
+        if len(batch) == 1 and len(batch_graph) == 1 and "error" not in batch_graph:
+            # A single file may come back under a slightly different name
+            batch_graph = {next(iter(batch)): next(iter(batch_graph.values()))}
+        description = analysis["description"] if len(batch) == 1 else None
+        for filename, entry in batch_graph.items():
+            if filename in batch and isinstance(entry, dict):
+                await asyncio.to_thread(cache.set, keys[filename], {"graph": entry, "description": description})
+        return {"description": analysis["description"], "graph": batch_graph}
+
+    # Let every batch finish (and be cached) before surfacing a failure
+    results = await asyncio.gather(*(analyze_batch(batch) for batch in batches), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    for result in results:
+        graph.update(result["graph"])
+        descriptions.append(result["description"])
+
+    return {
+        "description": "\n\n".join(dict.fromkeys(descriptions)),
+        "graph": graph
+    }
+
 @router.post("/analyze/", response_model=CodeAnalysisResponse)
-async def analyze_github_files(files_data: GitHubFiles = Body(...)):
+async def analyze_github_files(
+    files_data: GitHubFiles = Body(...),
+    client: httpx.AsyncClient = Depends(get_api_client),
+    http_cache: Optional[HTTPCache] = Depends(get_http_cache),
+    analysis_cache: PersistentCache = Depends(get_analysis_cache)
+):
     """
     Analyze multiple GitHub code files and return their structure as a graph
     
-    - Fetches code from GitHub URLs
-    - Uses AI to analyze the code structure
+    - Fetches code from GitHub URLs concurrently
+    - Uses AI to analyze the code structure, reusing cached analyses of unchanged files
     - Returns a graph representation of the code components
     """
     if not files_data.files:
         raise HTTPException(status_code=400, detail="No files provided")
     
     try:
-        # Fetch code for each file
-        code_files = {}
-        for file_url in files_data.files:
-            filename = str(file_url).split("/")[-1]
-            code = await fetch_code_from_github(str(file_url))
-            code_files[filename] = code
+        # Fetch code for every file concurrently, a few at a time
+        semaphore = asyncio.Semaphore(settings.GITHUB_FETCH_CONCURRENCY)
+
+        async def fetch(file_url):
+            async with semaphore:
+                return await fetch_code_from_github(str(file_url), client, http_cache)
+
+        codes = await asyncio.gather(*(fetch(file_url) for file_url in files_data.files))
+        code_files = {
+            str(file_url).split("/")[-1]: code
+            for file_url, code in zip(files_data.files, codes)
+        }
             
         # Analyze code with OpenAI
-        analysis = await analyze_code_with_openai(code_files)
+        analysis = await analyze_with_cache(code_files, client, analysis_cache)
         
         # Prepare response
         return JSONResponse(content={
@@ -271,13 +364,18 @@ async def analyze_github_files(files_data: GitHubFiles = Body(...)):
         raise HTTPException(status_code=500, detail=f"Error processing request: {str(e)}")
 
 @router.post("/analyze/single/", response_model=CodeAnalysisResponse)
-async def analyze_single_file(file_data: GitHubFile = Body(...)):
+async def analyze_single_file(
+    file_data: GitHubFile = Body(...),
+    client: httpx.AsyncClient = Depends(get_api_client),
+    http_cache: Optional[HTTPCache] = Depends(get_http_cache),
+    analysis_cache: PersistentCache = Depends(get_analysis_cache)
+):
     """Analyze a single GitHub code file and return its structure as a graph"""
     try:
-        code = await fetch_code_from_github(str(file_data.url))
+        code = await fetch_code_from_github(str(file_data.url), client, http_cache)
         filename = str(file_data.url).split("/")[-1]
         
-        analysis = await analyze_code_with_openai({filename: code})
+        analysis = await analyze_with_cache({filename: code}, client, analysis_cache)
         
         return JSONResponse(content={
             "description": analysis["description"],
@@ -5,6 +5,7 @@ class FileInfo(BaseModel):
     name: str
     path: str
     download_url: str
+    sha: Optional[str] = None  # Git blob SHA; lets the server skip unchanged files
 
 class IssueDetails(BaseModel):
     owner: str
@@ -22,6 +23,13 @@ class IssueAnalysisRequest(BaseModel):
     issueDetails: IssueDetails
 
 
+class BatchIssueAnalysisRequest(BaseModel):
+    owner: str
+    repo: str
+    filteredFiles: List[FileInfo]
+    issues: List[IssueDetails]
+
+
 class FileMatch(BaseModel):
     file_name: str
     match_score: float
@@ -35,3 +43,15 @@ class IssueAnalysisResponse(BaseModel):
     issuenum: int = 0
     owner: str
 
+
+
+class IssueMatches(BaseModel):
+    filename_matches: List[FileMatch]
+    description: str
+    issuenum: int = 0
+
+class BatchIssueAnalysisResponse(BaseModel):
+    results: List[IssueMatches]
+    overview: str
+    repo: str
+    owner: str
@@ -0,0 +1,157 @@
+import numpy as np
+from .config import CONFIG
+from .similarity import normalize, top_k
+
+class IVFIndex:
+    """
+    Inverted-file approximate nearest-neighbour index for cosine similarity.
+
+    Vectors are clustered with spherical k-means; a query only scans the `nprobe`
+    lists whose centroids are closest, so with ~sqrt(n) lists a search touches
+    O(sqrt(n)) vectors instead of all of them.
+    """
+    def __init__(self, nlist=None, nprobe=CONFIG['ANN_NPROBE'], iterations=10, seed=0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.ids = []
+        self.rows = {}  # id -> row in self.vectors
+        self.vectors = None
+        self.assignments = None
+        self.valid = None
+        self.size = 0  # Rows used in self.vectors, including removed ones
+        self.centroids = None
+        self.lists = []
+        self.inserted_since_build = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _assign(self, vectors, chunk=4096):
+        assignments = np.empty(len(vectors), dtype=np.int64)
+        for start in range(0, len(vectors), chunk):
+            assignments[start:start + chunk] = np.argmax(vectors[start:start + chunk] @ self.centroids.T, axis=1)
+        return assignments
+
+    def build(self, ids, vectors):
+        """
+        (Re)build the index from scratch over `ids` and their `vectors`.
+        """
+        vectors = normalize(vectors)
+        n = len(vectors)
+        nlist = self.nlist or max(1, int(np.sqrt(n)))
+        nlist = min(nlist, max(n, 1))
+        self.ids = list(ids)
+        self.rows = {id_: row for row, id_ in enumerate(self.ids)}
+        self.vectors = vectors
+        self.valid = np.ones(n, dtype=bool)
+        self.size = n
+        self.inserted_since_build = 0
+        if n == 0:
+            self.centroids = np.zeros((0, 0), dtype=np.float32)
+            self.assignments = np.zeros(0, dtype=np.int64)
+            self.lists = []
+            return
+
+        self.centroids = vectors[self.rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(self.iterations):
+            assignments = self._assign(vectors)
+            for c in range(nlist):
+                members = vectors[assignments == c]
+                if len(members):
+                    self.centroids[c] = members.sum(axis=0)
+                else:
+                    # Re-seed empty clusters so every list stays useful
+                    self.centroids[c] = vectors[self.rng.integers(n)]
+            self.centroids = normalize(self.centroids)
+        self.assignments = self._assign(vectors)
+        self.lists = [list(np.flatnonzero(self.assignments == c)) for c in range(nlist)]
+
+    def add(self, ids, vectors):
+        """
+        Insert (or replace) vectors without re-clustering; each goes to its nearest list.
+        """
+        vectors = normalize(vectors)
+        if self.centroids is None or len(self.centroids) == 0:
+            existing = [id_ for id_ in self.rows if id_ not in set(ids)]
+            if existing:
+                vectors = np.concatenate([self.vectors[[self.rows[id_] for id_ in existing]], vectors])
+            self.build(existing + list(ids), vectors)
+            return
+        self.remove(ids)
+        needed = self.size + len(vectors)
+        if needed > len(self.vectors):
+            capacity = max(needed, 2 * len(self.vectors))
+            grown = np.empty((capacity, self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+            self.valid = np.concatenate([self.valid[:self.size], np.zeros(capacity - self.size, dtype=bool)])
+            self.assignments = np.concatenate([self.assignments[:self.size], np.zeros(capacity - self.size, dtype=np.int64)])
+        assignments = self._assign(vectors)
+        for offset, (id_, vector, c) in enumerate(zip(ids, vectors, assignments)):
+            row = self.size + offset
+            self.vectors[row] = vector
+            self.valid[row] = True
+            self.assignments[row] = c
+            self.lists[c].append(row)
+            self.rows[id_] = row
+            if row < len(self.ids):
+                self.ids[row] = id_
+            else:
+                self.ids.append(id_)
+        self.size = needed
+        self.inserted_since_build += len(vectors)
+
+    def remove(self, ids):
+        for id_ in ids:
+            row = self.rows.pop(id_, None)
+            if row is not None:
+                self.valid[row] = False
+                self.lists[self.assignments[row]].remove(row)
+
+    def _live_vectors(self):
+        return self.vectors[[self.rows[id_] for id_ in self.rows]]
+
+    @property
+    def needs_rebuild(self):
+        """
+        True once inserts or removals have drifted far enough that the clustering is stale.
+        """
+        return self.inserted_since_build > len(self) // 2 or len(self) < self.size // 2
+
+    def rebuild(self):
+        ids = list(self.rows)
+        self.build(ids, self._live_vectors())
+
+    def search(self, query, k, threshold=None, exact=False):
+        """
+        Return (ids, scores) of the top k vectors by cosine similarity to `query`.
+        `exact=True` scans every vector, which is the reference for recall checks.
+        """
+        if not len(self) or k <= 0:
+            return [], np.zeros(0, dtype=np.float32)
+        query = normalize(query)
+        if exact:
+            candidates = np.flatnonzero(self.valid[:self.size])
+        else:
+            probes = top_k(self.centroids @ query, min(self.nprobe, len(self.centroids)))
+            candidates = np.fromiter(
+                (row for c in probes for row in self.lists[c]), dtype=np.int64
+            )
+        scores = self.vectors[candidates] @ query
+        best = top_k(scores, k, threshold)
+        return [self.ids[row] for row in candidates[best]], scores[best]
+
+    def recall(self, queries, k):
+        """
+        Mean fraction of the exact top k that the approximate search also returns.
+        """
+        hits = 0
+        total = 0
+        for query in np.atleast_2d(queries):
+            expected = set(self.search(query, k, exact=True)[0])
+            found = set(self.search(query, k)[0])
+            hits += len(expected & found)
+            total += len(expected)
+        return hits / total if total else 1.0
@@ -0,0 +1,116 @@
+import asyncio
+import io
+import logging
+import tarfile
+from urllib.parse import urlparse
+import aiohttp
+from .config import CONFIG
+from .limits import decode_prefix, looks_binary
+
+def parse_raw_url(url):
+    """
+    Split a raw.githubusercontent.com URL into (owner, repo, ref, path).
+    Returns None for anything else.
+    """
+    parsed = urlparse(url or '')
+    if parsed.netloc != 'raw.githubusercontent.com':
+        return None
+    parts = parsed.path.lstrip('/').split('/', 3)
+    if len(parts) < 4:
+        return None
+    return tuple(parts)
+
+def archive_source(files):
+    """
+    Return (owner, repo, ref) when every file comes from the same repository ref,
+    which is when one archive can replace the per-file downloads.
+    """
+    sources = set()
+    for file in files:
+        parsed = parse_raw_url(file.get('download_url'))
+        if parsed is None:
+            return None
+        sources.add(parsed[:3])
+        if len(sources) > 1:
+            return None
+    return sources.pop() if sources else None
+
+class _StreamReader(io.RawIOBase):
+    """
+    Blocking file object over an aiohttp stream, for use from a worker thread
+    while the event loop keeps receiving data. Every byte read is charged to
+    `budget`; once it runs out the stream ends early.
+    """
+    def __init__(self, stream, loop, timeout, budget=None):
+        self.stream = stream
+        self.loop = loop
+        self.timeout = timeout
+        self.budget = budget
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = asyncio.run_coroutine_threadsafe(self.stream.read(len(buffer)), self.loop).result(self.timeout)
+        if self.budget:
+            data = data[:self.budget.take(len(data))]
+        buffer[:len(data)] = data
+        return len(data)
+
+async def fetch_archive(session, files, out_queue, budget=None):
+    """
+    Download the repository tarball once and stream-extract only the requested
+    paths, putting each file on `out_queue` as it is reached. Other members are
+    skipped as the stream goes by, so the archive is never held in memory.
+    The downloaded archive bytes are charged to `budget`, and extraction stops
+    when it runs out. Each file is cut to CONFIG['MAX_FILE_BYTES']; binary
+    members are skipped. Returns the set of paths that were delivered.
+    """
+    source = archive_source(files)
+    if source is None:
+        return set()
+    owner, repo, ref = source
+    url = f"{CONFIG['ARCHIVE_BASE_URL'].rstrip('/')}/{owner}/{repo}/tar.gz/{ref}"
+    wanted = {file['path']: file for file in files}
+    delivered = set()
+    loop = asyncio.get_running_loop()
+    timeout = CONFIG['ARCHIVE_TIMEOUT']
+
+    def extract(stream):
+        with tarfile.open(fileobj=io.BufferedReader(_StreamReader(stream, loop, timeout, budget)), mode='r|gz') as tar:
+            for member in tar:
+                # Members are prefixed with "<repo>-<ref>/"
+                path = member.name.split('/', 1)[1] if '/' in member.name else ''
+                file = wanted.get(path)
+                if file is None or not member.isfile():
+                    continue
+                delivered.add(path)  # Binary members must not be refetched one by one
+                data = tar.extractfile(member).read(CONFIG['MAX_FILE_BYTES'])
+                if looks_binary(data):
+                    continue
+                if not data:
+                    continue
+                record = {
+                    'path': path,
+                    'content': decode_prefix(data),
+                    'size': member.size,
+                    'download_url': file['download_url'],
+                    'sha': file.get('sha')
+                }
+                asyncio.run_coroutine_threadsafe(out_queue.put(record), loop).result(timeout)
+                if len(delivered) == len(wanted):
+                    break
+
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout)) as response:
+            if response.status != 200:
+                logging.warning(f"Archive download failed for {owner}/{repo}@{ref} (HTTP {response.status})")
+                return delivered
+            await asyncio.to_thread(extract, response.content)
+    except Exception as e:
+        if budget and budget.exhausted:
+            logging.warning(f"Download budget exhausted while reading the archive of {owner}/{repo}@{ref}")
+        else:
+            logging.warning(f"Archive fetch for {owner}/{repo}@{ref} failed, falling back to per-file downloads: {e}")
+    logging.info(f"Archive provided {len(delivered)} of {len(wanted)} files for {owner}/{repo}@{ref}")
+    return delivered
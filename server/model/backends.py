@@ -0,0 +1,110 @@
+"""
+Inference backends for the embedding model.
+
+- torch: the SentenceTransformer as is; fp16 on CUDA when CONFIG['USE_FP16'], fp32 on CPU
+- int8:  torch with every Linear layer dynamically quantized to int8 (CPU only)
+- onnx:  the model exported to ONNX and run by onnxruntime
+         (needs `pip install "sentence-transformers[onnx]"`)
+
+Run `python -m model.backends` to check each backend's agreement with fp32 and its
+throughput on this machine before choosing one with EMBEDDING_BACKEND.
+"""
+import argparse
+import glob
+import os
+import time
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+from .config import CONFIG
+from .similarity import normalize
+
+BACKENDS = ('torch', 'int8', 'onnx')
+
+def detect_device() -> str:
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+def select_backend(device=None) -> str:
+    """
+    Backend from CONFIG['EMBEDDING_BACKEND']; 'auto' is plain torch, which runs fp16 on
+    CUDA and fp32 on CPU. int8 and onnx are CPU backends and fall back to torch on CUDA.
+    """
+    device = device or detect_device()
+    backend = CONFIG['EMBEDDING_BACKEND']
+    if backend == 'auto' or (device == 'cuda' and backend in ('int8', 'onnx')):
+        return 'torch'
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS} or 'auto'")
+    return backend
+
+def load_model(model_name, backend='torch', device=None, use_fp16=CONFIG['USE_FP16']):
+    """Load `model_name` for `backend`; every backend exposes SentenceTransformer.encode"""
+    device = device or detect_device()
+    if backend == 'torch':
+        model = SentenceTransformer(model_name, device=device)
+        if device == 'cuda' and use_fp16:
+            model = model.half()  # Use float16 to reduce memory; CPU fp16 matmuls are slow
+        return model
+    if backend == 'int8':
+        model = SentenceTransformer(model_name, device='cpu')
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if backend == 'onnx':
+        return SentenceTransformer(model_name, device='cpu', backend='onnx')
+    raise ValueError(f"Unknown embedding backend {backend!r}")
+
+def parity(reference, candidate, texts, batch_size=32):
+    """Cosine similarity between the two models' embeddings of each text (1.0 = identical)"""
+    a = normalize(reference.encode(texts, batch_size=batch_size, convert_to_numpy=True))
+    b = normalize(candidate.encode(texts, batch_size=batch_size, convert_to_numpy=True))
+    return np.sum(a * b, axis=1)
+
+def benchmark(model, texts, batch_size=32, repeats=3):
+    """Best texts-per-second over `repeats` runs (after one warm-up run)"""
+    model.encode(texts[:batch_size], batch_size=batch_size)
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+def sample_texts(directory, limit, chars=2000):
+    """Source files under `directory`, as realistic stand-ins for repository files"""
+    texts = []
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*.*'), recursive=True)):
+        if path.endswith(('.py', '.ts', '.tsx', '.js', '.md', '.json', '.txt')) and os.path.isfile(path):
+            with open(path, encoding='utf-8', errors='ignore') as f:
+                text = f.read(chars).strip()
+            if text:
+                texts.append(text)
+    if not texts:
+        raise ValueError(f"No sample files found under {directory}")
+    return (texts * (limit // len(texts) + 1))[:limit]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding backends against fp32 torch")
+    parser.add_argument('--model', default=CONFIG['EMBEDDING_MODEL'])
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--texts', type=int, default=256, help="number of sample texts")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--samples', default=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                        help="directory whose source files are used as sample texts")
+    args = parser.parse_args()
+
+    device = detect_device()
+    texts = sample_texts(args.samples, args.texts)
+    reference = load_model(args.model, 'torch', device='cpu', use_fp16=False)
+    print(f"{args.model} on {device}, {len(texts)} texts, selected backend: {select_backend(device)}")
+    print(f"{'backend':<8} {'texts/s':>10} {'min cos':>9} {'mean cos':>9}")
+    for backend in args.backends:
+        try:
+            model = load_model(args.model, backend, device=device)
+        except Exception as e:
+            print(f"{backend:<8} unavailable: {e}")
+            continue
+        agreement = parity(reference, model, texts, args.batch_size)
+        throughput = benchmark(model, texts, args.batch_size)
+        print(f"{backend:<8} {throughput:>10.1f} {agreement.min():>9.4f} {agreement.mean():>9.4f}")
+
+if __name__ == '__main__':
+    main()
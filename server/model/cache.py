@@ -1,5 +1,7 @@
 import hashlib
+import os
 import pickle
+import sqlite3
 import time
 from collections import OrderedDict
 import threading
@@ -32,3 +34,45 @@ class Cache:
             if len(self.store) >= self.max_size:
                 self.store.popitem(last=False)  # Remove the oldest item (LRU)
             self.store[key] = (pickle.dumps(value), time.time())  # Store with timestamp
+
+class PersistentCache:
+    """
+    Cache with the same get/set interface, backed by SQLite so entries survive
+    restarts and are shared by every worker on the host.
+    """
+    def __init__(self, path, ttl=3600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.cache_ttl = ttl  # Time-to-live in seconds
+        self.lock = threading.Lock()  # One connection shared by the worker's threads
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+        self.conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, created REAL)")
+        self.conn.commit()
+        self.writes = 0
+
+    def get_cache_key(self, data):
+        return hashlib.md5(str(data).encode()).hexdigest()
+
+    def get(self, key):
+        with self.lock:
+            row = self.conn.execute("SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if time.time() - created >= self.cache_ttl:
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, created) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), time.time())
+            )
+            self.writes += 1
+            if self.writes % 100 == 0:
+                # Remove expired entries now and then instead of on every read
+                self.conn.execute("DELETE FROM entries WHERE created < ?", (time.time() - self.cache_ttl,))
+            self.conn.commit()
@@ -1,12 +1,48 @@
 # config.py
+import os
+
 CONFIG = {
     'CACHE_TTL': 1800,  # Reduce TTL to free up memory faster
     'CACHE_MAX_SIZE': 5000,  # Limit cache entries to avoid excessive memory use
     'MAX_WORKERS': 4,  # Slightly reduce to avoid CPU overload
     'SIMILARITY_THRESHOLD': 0.15,  # Adjusted threshold for better filtering
+    'TOP_K': 3,  # Number of file matches returned per issue
     'REQUEST_TIMEOUT': 5,
     'BATCH_SIZE': 500,  # Reduce batch size to lower memory footprint
     'EMBEDDING_MODEL': 'paraphrase-MiniLM-L3-v2',  # Store model name for easy updates
-    'USE_FP16': True,  # Enable half-precision (lower memory usage)
+    'USE_FP16': True,  # Enable half-precision (lower memory usage) on CUDA; CPUs always run fp32
+    'EMBEDDING_BACKEND': os.getenv('EMBEDDING_BACKEND', 'auto'),  # auto, torch, int8 or onnx; see model/backends.py
+    'PREPROCESS_VERSION': 4,  # Bump when preprocessing or chunking changes so stored embeddings are recomputed
+    'CHUNK_MAX': 8,  # Windows of max_seq_length tokens embedded per file; the rest of a long file is not read
+    'CHUNK_POOLING': 'mean',  # How window vectors combine into a file vector: mean or max
+    'LEXICAL_CANDIDATES': 200,  # With more files than this, only each issue's best BM25 matches are embedded; 0 disables
+    'LEXICAL_WEIGHT': 0.3,  # Share of the BM25 score (scaled to [0, 1]) in a file's match score
+    'RERANK_MODEL': os.getenv('RERANK_MODEL', ''),  # Cross-encoder reranking the best matches, e.g. cross-encoder/ms-marco-MiniLM-L-6-v2; empty disables it
+    'RERANK_TOP_K': 20,  # Candidates per issue the cross-encoder reads
+    'RERANK_MARGIN': 0.15,  # Skip reranking when the best match leads the next by this much
+    'RERANK_BUDGET': 0.5,  # Seconds of cross-encoder time per issue; unscored candidates keep their order
+    'EMBEDDING_STORE_DIR': os.getenv('EMBEDDING_STORE_DIR', '.cache/embeddings'),  # Empty disables the on-disk store
+    'REPO_INDEX_DIR': os.getenv('REPO_INDEX_DIR', '.cache/repositories'),  # Repository index entries (entries.sqlite3), one row per file
+    'REPO_INDEX_MAX_REPOS': 100,  # Repository indexes kept in memory per worker
+    'ANN_MIN_FILES': 5000,  # Repositories with at least this many files are searched with the IVF index
+    'ANN_NPROBE': 8,  # IVF lists scanned per query; higher trades speed for recall
+    'ARCHIVE_MIN_FILES': 50,  # From this many files, fetch one repository tarball instead of per-file GETs
+    'ARCHIVE_BASE_URL': os.getenv('ARCHIVE_BASE_URL', 'https://codeload.github.com'),
+    'ARCHIVE_TIMEOUT': 60,
+    'HTTP_CACHE_DIR': os.getenv('HTTP_CACHE_DIR', '.cache/http'),  # Conditional-GET cache for raw downloads; empty disables it
+    'HTTP_CACHE_MAX_BYTES': 512 * 1024 * 1024,
+    'MAX_FILE_BYTES': 16 * 1024,  # Prefix of each file kept; the overview and embedding model only read the start
+    'MAX_REQUEST_BYTES': 32 * 1024 * 1024,  # Download budget for one request across all files
+    'BINARY_SNIFF_BYTES': 1024,  # Leading bytes checked for NUL before a file is treated as binary
+    'PIPELINE_QUEUE_SIZE': 64,  # Downloaded files waiting for preprocessing (bounds peak memory)
+    'EMBED_MICRO_BATCH': 32,  # Files embedded together while downloads are still running
+    'EMBEDDING_PROCESSES': os.getenv('EMBEDDING_PROCESSES', '').lower() in ('1', 'true', 'yes'),  # Encode in MAX_WORKERS worker processes per API process; run one API worker per host with it
+    'EMBED_WORKER_BATCH': 64,  # Texts merged into one worker batch
+    'EMBED_WORKER_WAIT': 0.005,  # Seconds a worker batch waits for more requests to merge
+    'EMBED_WORKER_TEXT_BYTES': 16 * 1024,  # Per-text slot in the shared input buffers
+    'OVERVIEW_EXCERPT_CHARS': 500,  # Characters of each file kept for the repository overview
+    'OVERVIEW_CONTEXT_TOKENS': 3000,  # LLM tokens of file excerpts included in the overview prompt
+    'OVERVIEW_CACHE_PATH': os.getenv('OVERVIEW_CACHE_PATH', '.cache/overviews.sqlite3'),  # Empty disables the overview cache
+    'OVERVIEW_CACHE_TTL': 7 * 24 * 3600,  # Overviews only change when the repository's files do
     'ASYNC_DOWNLOAD_LIMIT': 5  # Control concurrent file downloads to reduce memory spikes
 }
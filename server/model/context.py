@@ -0,0 +1,47 @@
+from .config import CONFIG
+from .tokens import count_tokens
+
+# Used to order files when no relevance scores are available
+PRIORITY_EXTENSIONS = (".py", ".md", ".js", ".java", ".c", ".cpp", ".h", ".sh", ".json", ".yaml", ".yml")
+
+def file_block(file):
+    return f"\n\nFILE: {file['path']}\n{file['excerpt']}"
+
+def select_excerpts(files, relevance=None, token_budget=None):
+    """
+    Choose the files whose excerpts go into the overview prompt, in prompt order.
+
+    Files are ranked by `relevance` (path -> similarity to the issue), falling back
+    to extension priority, and taken in one pass until `token_budget` LLM tokens
+    are used (OVERVIEW_CONTEXT_TOKENS by default). Returns (chosen files, number
+    of files left out).
+    """
+    if token_budget is None:
+        token_budget = CONFIG['OVERVIEW_CONTEXT_TOKENS']
+    if relevance:
+        ranked = sorted(files, key=lambda f: -relevance.get(f['path'], -1.0))
+    else:
+        ranked = sorted(files, key=lambda f: (not f['path'].endswith(PRIORITY_EXTENSIONS), f['path']))
+
+    chosen = []
+    used = 0
+    for file in ranked:
+        cost = count_tokens(file_block(file))
+        if used + cost <= token_budget:
+            chosen.append(file)
+            used += cost
+    return chosen, len(ranked) - len(chosen)
+
+def format_file_context(chosen, omitted=0):
+    """The "FILE: path\\n<excerpt>" blocks of `chosen`; left-out files get a single trailing line"""
+    blocks = [file_block(file) for file in chosen]
+    if omitted:
+        blocks.append(f"\n\n({omitted} more files omitted to fit the context budget)")
+    return ''.join(blocks)
+
+def build_file_context(files, relevance=None, token_budget=None):
+    """
+    Assemble the "FILE: path\\n<excerpt>" blocks for the overview prompt from the
+    excerpts select_excerpts picks.
+    """
+    return format_file_context(*select_excerpts(files, relevance, token_budget))
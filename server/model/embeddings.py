@@ -1,16 +1,162 @@
-from sentence_transformers import SentenceTransformer
-import torch
+import functools
+import threading
+import numpy as np
+from .backends import load_model, select_backend
+from .config import CONFIG
+from .similarity import normalize
+from .workers import EmbeddingWorkerPool
 
 class EmbeddingGenerator:
-    def __init__(self):
+    def __init__(self, batch_size=CONFIG['BATCH_SIZE'], store=None, processes=CONFIG['EMBEDDING_PROCESSES']):
         self.model = None  # Lazy load the model
+        self.model_name = CONFIG['EMBEDDING_MODEL']
+        self.backend = select_backend()
+        self.batch_size = batch_size
+        self.store = store  # Optional EmbeddingStore shared across requests and restarts
+        self.processes = processes  # Encode in this process's own pool of worker processes
+        self.pool = None
+        self.lock = threading.RLock()  # Issue and document threads may ask for the model or pool at once
+
+    @property
+    def store_name(self):
+        """Name stored vectors are kept under; other backends' vectors differ slightly"""
+        return self.model_name if self.backend == 'torch' else f"{self.model_name}-{self.backend}"
 
     def get_model(self):
         if self.model is None:
-            self.model = SentenceTransformer('paraphrase-MiniLM-L3-v2')
-            self.model = self.model.half()  # Use float16 to reduce memory
+            with self.lock:
+                if self.model is None:
+                    self.model = load_model(self.model_name, self.backend)
         return self.model
 
+    def get_pool(self):
+        """
+        This process's worker pool, started on first use. Every API process has its own:
+        see EmbeddingWorkerPool for what that costs in memory per host.
+        """
+        if self.pool is not None:
+            return self.pool
+        with self.lock:
+            if self.pool is not None:
+                return self.pool
+            # Only plain torch weights can be mapped by the workers; other backends load in each worker
+            pool = EmbeddingWorkerPool(
+                self.get_model() if self.backend == 'torch' else None,
+                workers=CONFIG['MAX_WORKERS'],
+                max_batch=CONFIG['EMBED_WORKER_BATCH'],
+                batch_wait=CONFIG['EMBED_WORKER_WAIT'],
+                text_bytes=CONFIG['EMBED_WORKER_TEXT_BYTES'],
+                loader=None if self.backend == 'torch' else functools.partial(load_model, self.model_name, self.backend, 'cpu'),
+            )
+            pool.start()
+            self.pool = pool  # Published only once started, so no other thread starts it again
+        return self.pool
+
+    def get_tokenizer(self):
+        """
+        The model's tokenizer and max_seq_length. With a worker pool they come from the
+        workers, so quantized/ONNX models are still never loaded in this process.
+        """
+        if self.processes:
+            pool = self.get_pool()
+            return pool.tokenizer, pool.max_seq_length
+        model = self.get_model()
+        return model.tokenizer, model.max_seq_length
+
     def generate_embedding(self, text):
         model = self.get_model()  # Load model only when needed
         return model.encode(text, convert_to_tensor=True)
+
+    def generate_embeddings(self, texts, keys=None):
+        """
+        Embed many texts in length-sorted batches and return a float32 matrix
+        whose rows follow the order of `texts`.
+
+        When `keys` is given (one store key or None per text), stored vectors are
+        reused and only the misses go through the model.
+        """
+        return self._with_store(keys, len(texts), lambda missing: self.encode([texts[i] for i in missing]))
+
+    def generate_document_embeddings(self, documents, keys=None, pooling=CONFIG['CHUNK_POOLING']):
+        """
+        Embed documents given as lists of text chunks, one row per document.
+
+        The chunks of every document that isn't stored go through the model together,
+        in shared batches; each document's normalized chunk vectors are then pooled
+        ('mean' or element-wise 'max') into its vector, which is what gets stored.
+        """
+        def compute(missing):
+            chunks = [chunk for i in missing for chunk in documents[i]]
+            vectors = normalize(self.encode(chunks))
+            bounds = np.cumsum([0] + [len(documents[i]) for i in missing])
+            pool = np.max if pooling == 'max' else np.mean
+            pooled = np.empty((len(missing), vectors.shape[1]), dtype=np.float32)
+            for row, (start, end) in enumerate(zip(bounds, bounds[1:])):
+                pooled[row] = pool(vectors[start:end], axis=0)
+            return pooled
+        return self._with_store(keys, len(documents), compute)
+
+    def _with_store(self, keys, count, compute):
+        """
+        Rows for `count` items: stored vectors for keys the store has, and
+        `compute(missing_indices)` for the rest, which are then stored.
+        """
+        if self.store is None or keys is None:
+            return compute(list(range(count)))
+
+        stored = self.store.get_many([key for key in keys if key is not None])
+        missing = [i for i, key in enumerate(keys) if key not in stored]
+        encoded = compute(missing)
+        self.store.put_many(
+            [keys[i] for i in missing if keys[i] is not None],
+            [vector for i, vector in zip(missing, encoded) if keys[i] is not None]
+        )
+        if not stored:
+            return encoded
+
+        embeddings = np.empty((count, self.store.dim), dtype=np.float32)
+        for i, key in enumerate(keys):
+            if key in stored:
+                embeddings[i] = stored[key]
+        if missing:
+            embeddings[missing] = encoded
+        return embeddings
+
+    def encode(self, texts):
+        """
+        Run the model over `texts` in length-sorted batches of `batch_size`, or hand
+        them to the worker pool, which merges them with other requests' batches.
+        """
+        # Similar lengths in the same batch keep padding (and wasted compute) low
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        if self.processes:
+            pool = self.get_pool()
+            embeddings = np.empty((len(texts), pool.dim), dtype=np.float32)
+            embeddings[order] = pool.encode([texts[i] for i in order])
+            return embeddings
+
+        model = self.get_model()
+        embeddings = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            embeddings[batch] = model.encode(
+                [texts[i] for i in batch],
+                batch_size=len(batch),
+                convert_to_numpy=True,
+            ).astype(np.float32)
+        return embeddings
+
+    def warm_up(self):
+        """
+        Load the model (and start the worker processes, when enabled) and run one
+        encode so the first request doesn't pay for it.
+        """
+        if self.processes:
+            self.encode(["warm up"])
+        else:
+            self.generate_embedding("warm up")
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
@@ -0,0 +1,104 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+
+class HTTPCache:
+    """
+    On-disk cache of downloaded file bodies with their ETag / Last-Modified
+    validators, so repeat downloads can be revalidated with a conditional GET.
+    Entries are evicted least-recently-used first once the cache exceeds `max_bytes`.
+
+    Every method does blocking file I/O (set may scan the whole directory to evict):
+    call them from async code through asyncio.to_thread.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith('.json'))
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def get(self, url):
+        """
+        Return the cached entry for `url` ({'etag', 'last_modified', 'body', 'size', 'truncated'}) or None.
+        """
+        path = self._path(url)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)  # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return entry if entry.get('url') == url else None
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        Request headers that let the server answer 304 if `entry` is still current.
+        """
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def set(self, url, response_headers, body, size=None, truncated=False):
+        """
+        Store `body` (and the full file `size` when only a prefix was kept) if the
+        response carried a validator worth revalidating with. `truncated` marks a
+        prefix, which a 304 only confirms to callers that want no more than that.
+        """
+        etag = response_headers.get('ETag')
+        last_modified = response_headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        path = self._path(url)
+        data = json.dumps({
+            'url': url, 'etag': etag, 'last_modified': last_modified,
+            'body': body, 'size': size, 'truncated': truncated
+        })
+        with self.lock:
+            try:
+                previous = os.path.getsize(path)
+            except OSError:
+                previous = 0
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            try:
+                with open(tmp_path, 'w') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logging.warning(f"Could not write HTTP cache entry for {url}: {e}")
+                return
+            self.total_bytes += os.path.getsize(path) - previous
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """
+        Delete least recently used entries until the cache is back under 90% of its cap.
+        """
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.total_bytes = total
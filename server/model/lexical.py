@@ -0,0 +1,96 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z0-9]+(?:_[A-Za-z0-9]+)*')
+CAMEL_PATTERN = re.compile(r'[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|[0-9]+')
+
+def split_identifier(identifier: str):
+    """
+    Lowercased parts of a camelCase / snake_case identifier, plus the whole
+    identifier so exact names still match: getUserName -> getusername, get, user, name.
+    """
+    parts = [part.lower() for piece in identifier.split('_') for part in CAMEL_PATTERN.findall(piece)]
+    whole = identifier.replace('_', '').lower()
+    return parts if len(parts) == 1 and parts[0] == whole else [whole] + parts
+
+def tokenize(text: str):
+    """Identifier-aware tokens of `text`; one-letter parts are dropped"""
+    return [
+        token
+        for match in IDENTIFIER_PATTERN.finditer(text)
+        for token in split_identifier(match.group())
+        if len(token) > 1
+    ]
+
+def document_terms(path: str, content: str) -> Dict[str, int]:
+    """Term frequencies of a file: its content plus its path, so file names match too"""
+    terms = Counter(tokenize(content))
+    terms.update(tokenize(path))
+    return dict(terms)
+
+class BM25Index:
+    """
+    Inverted index scoring documents against a query with Okapi BM25.
+    Documents can be added and removed one at a time; statistics stay exact.
+    """
+    def __init__(self, k1=1.2, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(dict)  # term -> {doc: term frequency}
+        self.terms = {}  # doc -> its terms, to undo `add`
+        self.lengths = {}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, doc, terms: Dict[str, int]):
+        self.remove([doc])
+        for term, tf in terms.items():
+            self.postings[term][doc] = tf
+        self.terms[doc] = list(terms)
+        self.lengths[doc] = sum(terms.values())
+        self.total_length += self.lengths[doc]
+
+    def remove(self, docs: Iterable):
+        for doc in docs:
+            if doc not in self.lengths:
+                continue
+            for term in self.terms.pop(doc):
+                posting = self.postings[term]
+                posting.pop(doc, None)
+                if not posting:
+                    del self.postings[term]
+            self.total_length -= self.lengths.pop(doc)
+
+    def scores(self, query_terms) -> Dict:
+        """BM25 score of every document sharing at least one term with the query"""
+        n = len(self.lengths)
+        if not n:
+            return {}
+        average = self.total_length / n or 1
+        scores = defaultdict(float)
+        for term in set(query_terms):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            for doc, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / average)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+def lexical_relevance(documents, query_terms) -> Dict:
+    """
+    BM25 score of each document (a dict with 'path' and 'terms') against the query,
+    scaled so the best match is 1.0.
+    """
+    index = BM25Index()
+    for document in documents:
+        if 'terms' in document:
+            index.add(document['path'], document['terms'])
+    scores = index.scores(query_terms)
+    top = max(scores.values(), default=0.0)
+    return {path: score / top for path, score in scores.items()} if top > 0 else {}
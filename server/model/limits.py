@@ -0,0 +1,35 @@
+import threading
+from .config import CONFIG
+
+def looks_binary(chunk: bytes) -> bool:
+    """
+    Cheap binary sniff on the first bytes of a file: NUL bytes never appear in text.
+    """
+    return b'\x00' in chunk[:CONFIG['BINARY_SNIFF_BYTES']]
+
+def decode_prefix(data: bytes, encoding='utf-8') -> str:
+    """
+    Decode a byte prefix that may end in the middle of a multi-byte character.
+    """
+    return data.decode(encoding or 'utf-8', errors='ignore')
+
+class ByteBudget:
+    """
+    Total bytes a single request may download, shared by all of its downloads.
+    """
+    def __init__(self, limit=CONFIG['MAX_REQUEST_BYTES']):
+        self.remaining = limit
+        self.lock = threading.Lock()  # Archive extraction takes from a worker thread
+
+    def take(self, wanted: int) -> int:
+        """
+        Reserve up to `wanted` bytes and return how many were granted.
+        """
+        with self.lock:
+            granted = max(0, min(wanted, self.remaining))
+            self.remaining -= granted
+            return granted
+
+    @property
+    def exhausted(self):
+        return self.remaining <= 0
@@ -0,0 +1,186 @@
+import json
+
+GRAPH_START, GRAPH_END = "---JSON_GRAPH---", "---JSON_END---"
+DESCRIPTION_START, DESCRIPTION_END = "---DESCRIPTION---", "---DESCRIPTION_END---"
+
+_SECTIONS = {GRAPH_START: ("graph", GRAPH_END), DESCRIPTION_START: ("description", DESCRIPTION_END)}
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_ESCAPES = {"\n": "\\n", "\r": "\\r", "\t": "\\t"}
+
+def _drop_trailing_comma(out):
+    k = len(out) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    if k >= 0 and out[k] == ",":
+        del out[k]
+
+def _last_token(out, end=None):
+    k = (len(out) if end is None else end) - 1
+    while k >= 0 and out[k].isspace():
+        k -= 1
+    return k
+
+def _drop_dangling_member(out, stack):
+    """Remove an object member cut off before its value: a lone key, or `key:`"""
+    if not stack or stack[-1] != "}":
+        return
+    k = _last_token(out)
+    if k >= 0 and out[k][0].isalpha() and out[k] not in _LITERALS.values():
+        # Bare word cut off mid-way, e.g. `"a": tr`
+        del out[k:]
+        k = _last_token(out)
+    if k >= 0 and out[k] == ":":
+        del out[k:]
+        k = _last_token(out)
+    elif k < 0 or _last_token(out, k) < 0 or out[_last_token(out, k)] not in "{,":
+        return  # A complete value, not a key
+    if k >= 0 and (out[k][0] == '"' or out[k][0].isalpha()):
+        del out[k:]
+
+def repair_json(text: str) -> str:
+    """
+    Fix the JSON defects LLMs commonly emit, in one pass over `text`: markdown fences,
+    // and /* */ comments, single-quoted strings, raw newlines inside strings, trailing
+    commas, Python literals, bare keys and unclosed strings/brackets or members left
+    without a value by truncated output.
+    String contents are never rewritten beyond what is needed to make them valid.
+    """
+    out, stack = [], []
+    i, n = 0, len(text)
+    while i < n:
+        c = text[i]
+        if c == '"' or c == "'":
+            buf = ['"']
+            j = i + 1
+            while j < n and text[j] != c:
+                d = text[j]
+                if d == "\\" and j + 1 < n:
+                    buf.append("'" if text[j + 1] == "'" else text[j:j + 2])
+                    j += 2
+                    continue
+                buf.append('\\"' if d == '"' else _ESCAPES.get(d, d))
+                j += 1
+            buf.append('"')
+            out.append("".join(buf))
+            i = j + 1
+        elif text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        elif text.startswith("```", i):
+            # Fence, possibly with a language tag
+            i += 3
+            while i < n and text[i].isalnum():
+                i += 1
+        elif c in "{[":
+            stack.append("}" if c == "{" else "]")
+            out.append(c)
+            i += 1
+        elif c in "}]":
+            _drop_trailing_comma(out)
+            if stack and stack[-1] == c:
+                stack.pop()
+            out.append(c)
+            i += 1
+        elif c.isalpha() or c == "_":
+            j = i
+            while j < n and (text[j].isalnum() or text[j] in "_$-"):
+                j += 1
+            word = text[i:j]
+            k = j
+            while k < n and text[k] in " \t":
+                k += 1
+            if word in _LITERALS:
+                out.append(_LITERALS[word])
+            elif k < n and text[k] == ":":
+                out.append(json.dumps(word))
+            else:
+                out.append(word)
+            i = j
+        else:
+            out.append(c)
+            i += 1
+    _drop_dangling_member(out, stack)
+    _drop_trailing_comma(out)
+    out.extend(reversed(stack))
+    return "".join(out)
+
+def parse_graph(text: str) -> dict:
+    """Parse the graph JSON, repairing it locally only when it is not valid as-is"""
+    text = text.strip()
+    try:
+        graph = json.loads(text)
+    except json.JSONDecodeError:
+        graph = json.loads(repair_json(text))
+    if not isinstance(graph, dict):
+        raise ValueError("JSON graph is not an object")
+    return graph
+
+class GraphResponseParser:
+    """
+    Incremental parser for the marker format of the code-analysis prompt:
+
+        ---JSON_GRAPH--- {...} ---JSON_END---
+        ---DESCRIPTION--- text ---DESCRIPTION_END---
+
+    Feed completion text as it streams in; each character is scanned once and the graph
+    is parsed as soon as its end marker arrives. A section left open by a truncated
+    response is closed at the end of the stream.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.graph = None
+        self._section = None
+        self._end = None
+        self._parts = []
+        self._pending = ""
+
+    def feed(self, chunk: str):
+        self._pending += chunk
+        while self._pending:
+            if self._section is None:
+                found = [(self._pending.find(marker), marker) for marker in _SECTIONS]
+                found = [(pos, marker) for pos, marker in found if pos != -1]
+                if not found:
+                    # Keep just enough to match a marker split across chunks
+                    self._pending = self._pending[-(len(DESCRIPTION_START) - 1):]
+                    return
+                pos, marker = min(found)
+                self._section, self._end = _SECTIONS[marker]
+                self._pending = self._pending[pos + len(marker):]
+            else:
+                pos = self._pending.find(self._end)
+                if pos == -1:
+                    keep = len(self._end) - 1
+                    if len(self._pending) > keep:
+                        self._parts.append(self._pending[:-keep])
+                        self._pending = self._pending[-keep:]
+                    return
+                self._parts.append(self._pending[:pos])
+                self._pending = self._pending[pos + len(self._end):]
+                self._finish_section()
+
+    def _finish_section(self):
+        text = "".join(self._parts)
+        self._parts = []
+        self.sections.setdefault(self._section, text)
+        if self._section == "graph" and self.graph is None:
+            self.graph = parse_graph(text)
+        self._section = self._end = None
+
+    def close(self) -> dict:
+        """Finish the stream and return {"description", "graph"}"""
+        if self._section is not None:
+            self._parts.append(self._pending)
+            self._pending = ""
+            self._finish_section()
+        if "graph" not in self.sections:
+            raise ValueError("Missing JSON markers in response")
+        description = self.sections.get("description", "").strip()
+        return {
+            "description": description or "No description available",
+            "graph": self.graph
+        }
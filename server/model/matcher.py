@@ -1,119 +1,313 @@
-from concurrent.futures import ThreadPoolExecutor
 import asyncio
+import contextlib
+import hashlib
+import heapq
 import aiohttp
-from typing import Dict, List
 import numpy as np
-from .cache import Cache
+from typing import Dict, List
+from .archive import fetch_archive
+from .cache import Cache, PersistentCache
+from .config import CONFIG
 from .embeddings import EmbeddingGenerator
+from .http_cache import HTTPCache
+from .limits import ByteBudget, decode_prefix, looks_binary
+from .context import build_file_context, format_file_context, select_excerpts
+from .lexical import document_terms, lexical_relevance, tokenize
+from .similarity import cosine_scores, cosine_top_k_many
+from .rerank import Reranker
+from .repo_index import RepositoryIndexes, blob_sha, repository_fingerprint
+from .store import EmbeddingStore, content_key
 import logging
 import os
-from openai import OpenAI
+import re
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Initialize OpenAI client (OPENAI_BASE_URL points it at any OpenAI-compatible server)
+client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 # logging.basicConfig(level=logging.INFO)
 
+OVERVIEW_ERROR = "Failed to generate repository overview due to an error."
+
+WORD_PATTERN = re.compile(r'\S+')
+
 class IssueMatcher:
-    def __init__(self):
-        self.cache = Cache()
+    def __init__(self, top_k=CONFIG['TOP_K'], similarity_threshold=CONFIG['SIMILARITY_THRESHOLD'], session=None, http_cache=None, llm_client=None):
+        self.cache = Cache(max_size=CONFIG['CACHE_MAX_SIZE'], ttl=CONFIG['CACHE_TTL'])
         self.embedding_generator = EmbeddingGenerator()
-        self.max_workers = 5
+        if CONFIG['EMBEDDING_STORE_DIR']:
+            self.embedding_generator.store = EmbeddingStore(
+                CONFIG['EMBEDDING_STORE_DIR'], self.embedding_generator.store_name
+            )
+        self.repo_indexes = RepositoryIndexes(self.embedding_generator.store)
+        self.overview_cache = None
+        if CONFIG['OVERVIEW_CACHE_PATH']:
+            self.overview_cache = PersistentCache(CONFIG['OVERVIEW_CACHE_PATH'], ttl=CONFIG['OVERVIEW_CACHE_TTL'])
         self.semaphore = asyncio.Semaphore(10)  # Limit concurrent requests
+        self.top_k = top_k
+        self.similarity_threshold = similarity_threshold
+        self.session = session  # Shared aiohttp session; a per-call one is used when None
+        self.http_cache = http_cache  # Optional HTTPCache for conditional GETs
+        self.llm_client = llm_client or client
+        self.reranker = None  # Optional cross-encoder over the first stage's best matches
+        if CONFIG['RERANK_MODEL']:
+            self.reranker = Reranker(
+                CONFIG['RERANK_MODEL'],
+                top_k=CONFIG['RERANK_TOP_K'],
+                margin=CONFIG['RERANK_MARGIN'],
+                budget=CONFIG['RERANK_BUDGET'],
+            )
 
-    async def download_file_content(self, session, file):
+    async def download_file_content(self, session, file, budget=None):
+        """
+        Stream one file, keeping at most CONFIG['MAX_FILE_BYTES'] of it and charging
+        what was read to the request's ByteBudget. Binary files are dropped as soon
+        as the first chunk gives them away.
+        """
         if not file.get('download_url'):
             logging.warning(f"Skipping file without URL: {file.get('path', 'Unknown')}")
             return None
+        url = file['download_url']
+        record = {'path': file['path'], 'download_url': url, 'sha': file.get('sha')}
+        cached = await asyncio.to_thread(self.http_cache.get, url) if self.http_cache else None
         try:
             async with self.semaphore:  # Prevent excessive concurrent requests
-                async with session.get(file['download_url'], timeout=5) as response:
-                    if response.status == 200:
-                        content = await response.text()
-                        return {'path': file['path'], 'content': content, 'download_url': file['download_url']}
-                    logging.error(f"Failed to download {file['path']} (HTTP {response.status})")
+                async with session.get(url, timeout=5, headers=HTTPCache.conditional_headers(cached)) as response:
+                    if response.status == 304 and cached:
+                        # The entry may hold a whole file stored by the prompts router
+                        return dict(record, content=cached['body'][:CONFIG['MAX_FILE_BYTES']], size=cached.get('size') or len(cached['body']))
+                    if response.status != 200:
+                        logging.error(f"Failed to download {file['path']} (HTTP {response.status})")
+                        return None
+
+                    data = bytearray()
+                    limit = CONFIG['MAX_FILE_BYTES']
+                    truncated = False
+                    out_of_budget = False
+                    async for chunk in response.content.iter_chunked(8192):
+                        if not data and looks_binary(chunk):
+                            logging.info(f"Skipping binary file {file['path']}")
+                            return None
+                        wanted = min(len(chunk), limit - len(data))
+                        granted = budget.take(wanted) if budget else wanted
+                        data += chunk[:granted]
+                        if granted < wanted:
+                            logging.warning(f"Download budget exhausted while reading {file['path']}")
+                            truncated = out_of_budget = True
+                            break
+                        if len(data) >= limit:
+                            truncated = True
+                            break  # Leaving the block drops the rest of the body
+                    if not data:
+                        return None
+
+                    content = decode_prefix(bytes(data), response.charset)
+                    size = len(data)
+                    if truncated and 'Content-Encoding' not in response.headers:
+                        size = int(response.headers.get('Content-Length', size))
+                    # A body cut short by the budget is not the prefix a later 304 should stand for
+                    if self.http_cache and not out_of_budget:
+                        await asyncio.to_thread(self.http_cache.set, url, response.headers, content, size, truncated)
+                    return dict(record, content=content, size=size)
         except asyncio.TimeoutError:
             logging.error(f"Timeout when downloading {file['path']}")
         except Exception as e:
             logging.exception(f"Error downloading {file['path']}: {e}")
         return None
 
-    async def fetch_all_files(self, files):
-        async with aiohttp.ClientSession() as session:
-            tasks = [self.download_file_content(session, file) for file in files]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
-            return [r for r in results if r]
+    async def fetch_files(self, files, out_queue):
+        """
+        Download `files`, putting each one on `out_queue` as soon as it arrives, then
+        a final None. Large file sets from one repository are read from a single
+        tarball; anything the archive didn't provide falls back to per-file GETs.
+        """
+        budget = ByteBudget()
+
+        async def fetch(session, file):
+            if budget.exhausted:
+                return
+            record = await self.download_file_content(session, file, budget)
+            if record:
+                await out_queue.put(record)
+
+        async with contextlib.AsyncExitStack() as stack:
+            session = self.session or await stack.enter_async_context(aiohttp.ClientSession())
+            if len(files) >= CONFIG['ARCHIVE_MIN_FILES']:
+                delivered = await fetch_archive(session, files, out_queue, budget)
+                files = [file for file in files if file['path'] not in delivered]
+            await asyncio.gather(*(fetch(session, file) for file in files))
+        await out_queue.put(None)
 
-    def preprocess_content(self, content: str) -> str:
+    def prepare_record(self, record):
         """
-        Preprocess text by converting to lowercase and removing short words.
+        Reduce a downloaded file to what later stages need, dropping its full content.
         """
-        content = content.lower()
-        return ' '.join(word for word in content.split() if len(word) > 2 or word.isalnum())
+        content = record.pop('content')
+        excerpt_chars = CONFIG['OVERVIEW_EXCERPT_CHARS']
+        record.update({
+            'sha': record.get('sha') or blob_sha(content),
+            'key': content_key(content),
+            'size': record.get('size') or len(content),
+            'excerpt': content[:excerpt_chars] + "..." if len(content) > excerpt_chars else content,
+            'chunks': self.preprocess_chunks(content),
+            'terms': document_terms(record['path'], content),
+        })
+        return record
 
-    def calculate_similarity(self, vec1, vec2):
+    async def fetch_and_embed(self, files, on_fetched=None, progress=None, embed=True):
         """
-        Compute cosine similarity between two vectors.
+        Stream `files` through download -> preprocess -> embed.
+
+        Each file is preprocessed as soon as it arrives and embedded in micro-batches
+        on a worker thread while downloads are still in flight. The bounded queues
+        cap how much file text is held at once, whatever the repository size.
+        `on_fetched(records)` is called once every file has been downloaded and
+        preprocessed, while the last batches may still be embedding, and
+        `progress(stage, done, total)` after every micro-batch.
+
+        With `embed=False` records keep their text chunks and are not embedded, so
+        the caller can choose which of them are worth running through the model.
         """
+        progress = progress or (lambda stage, done, total: None)
+        downloaded = asyncio.Queue(maxsize=CONFIG['PIPELINE_QUEUE_SIZE'])
+        batches = asyncio.Queue(maxsize=2)
+        records = []
+
+        async def preprocess():
+            batch = []
+            while (record := await downloaded.get()) is not None:
+                record = self.prepare_record(record)
+                records.append(record)
+                if embed:
+                    batch.append(record)
+                if len(records) % CONFIG['EMBED_MICRO_BATCH'] == 0:
+                    progress('fetch', len(records), len(files))
+                if len(batch) >= CONFIG['EMBED_MICRO_BATCH']:
+                    await batches.put(batch)
+                    batch = []
+            progress('fetch', len(records), len(files))
+            if on_fetched:
+                on_fetched(records)
+            if batch:
+                await batches.put(batch)
+            await batches.put(None)
+
+        async def embed_batches():
+            embedded = 0
+            while (batch := await batches.get()) is not None:
+                embeddings = await asyncio.to_thread(
+                    self.embedding_generator.generate_document_embeddings,
+                    [record.pop('chunks') for record in batch],
+                    [record['key'] for record in batch]
+                )
+                for record, embedding in zip(batch, embeddings):
+                    record['embedding'] = embedding
+                embedded += len(batch)
+                progress('embed', embedded, len(files))
+
+        stages = [self.fetch_files(files, downloaded), preprocess()] + ([embed_batches()] if embed else [])
+        stages = [asyncio.create_task(stage) for stage in stages]
         try:
-            return float(np.dot(vec1, vec2) / (np.linalg.norm(vec1) * np.linalg.norm(vec2)))
-        except ZeroDivisionError:
-            return 0.0
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+        return records
+
+    async def embed_entries(self, index, paths, files, progress=None):
+        """
+        Embed the indexed files among `paths` that have no vector yet and return how
+        many there were. Files fetched by this request still have their text chunks;
+        the others are downloaded again from `files` (path -> requested file).
+        """
+        missing = [path for path in paths if 'embedding' not in index.files[path]]
+        if not missing:
+            return 0
+        chunked = [path for path in missing if 'chunks' in index.files[path]]
+        if chunked:
+            embeddings = await asyncio.to_thread(
+                self.embedding_generator.generate_document_embeddings,
+                [index.files[path]['chunks'] for path in chunked],
+                [index.files[path]['key'] for path in chunked]
+            )
+            for path, embedding in zip(chunked, embeddings):
+                entry = index.files[path]
+                entry.pop('chunks')
+                entry['embedding'] = embedding
+                index.update(path, entry)
+        refetch = [files[path] for path in missing if path not in chunked]
+        if refetch:
+            records = await self.fetch_and_embed(refetch)
+            for record in records:
+                index.update(record.pop('path'), record)
+        if progress:
+            progress('embed', len(missing), len(missing))
+        return len(missing)
+
+    def preprocess_chunks(self, content: str) -> List[str]:
+        """
+        Lowercase text and drop short words, then split it into windows the model reads
+        whole: max_seq_length minus the special tokens it adds, counted with the model's
+        own tokenizer, and at most CHUNK_MAX of them. Words are read lazily, so nothing
+        past what the last window could hold is lowercased or even scanned.
+        """
+        tokenizer, max_seq_length = self.embedding_generator.get_tokenizer()
+        window = max_seq_length - tokenizer.num_special_tokens_to_add(pair=False)
+        limit = window * CONFIG['CHUNK_MAX']  # Every word is at least one token
+        words = []
+        for match in WORD_PATTERN.finditer(content):
+            word = match.group().lower()
+            if len(word) > 2 or word.isalnum():
+                words.append(word)
+                if len(words) >= limit:
+                    break
+        text = ' '.join(words)
+        offsets = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)['offset_mapping']
+        offsets = offsets[:limit]
+        return [
+            text[offsets[i][0]:offsets[min(i + window, len(offsets)) - 1][1]]
+            for i in range(0, len(offsets), window)
+        ] or ['']
 
-    def analyze_repository(self, file_contents):
+    async def analyze_repository(self, files, relevance=None, important_content=None):
         """
         Analyze all files in the repository and generate a comprehensive overview.
+        Each file is a dict with 'path', 'size' and 'excerpt' (the start of its content);
+        `relevance` maps paths to their similarity to the issue and decides which
+        excerpts make it into the prompt.
         """
         # Prepare file structure and content for analysis
         repo_structure = []
         
         # Group files by directory/category
         directories = {}
-        for path, content in file_contents.items():
+        for file in files:
+            path = file['path']
             dir_name = os.path.dirname(path) or "root"
             if dir_name not in directories:
                 directories[dir_name] = []
             
             # Extract file extension and size info
             ext = os.path.splitext(path)[1]
-            size = len(content)
             
             directories[dir_name].append({
                 "path": path,
                 "extension": ext,
-                "size": size,
-                "content": content[:500] + "..." if len(content) > 500 else content  # First 500 chars
+                "size": file['size']
             })
         
         # Create structured representation of the repo
-        for dir_name, files in directories.items():
-            file_info = [f"- {f['path']} ({f['extension']}, {f['size']} bytes)" for f in files]
+        for dir_name, dir_files in directories.items():
+            file_info = [f"- {f['path']} ({f['extension']}, {f['size']} bytes)" for f in dir_files]
             repo_structure.append(f"Directory: {dir_name}\nFiles:\n" + "\n".join(file_info))
         
-        # Concatenate important files content (keeping token count manageable)
-        important_content = ""
-        total_chars = 0
-        char_limit = 15000  # Adjust based on model's context window
-        
-        # Prioritize likely important files (.py, .md, etc.)
-        priority_extensions = [".py", ".md", ".js", ".java", ".c", ".cpp", ".h", ".sh", ".json", ".yaml", ".yml"]
-        sorted_files = sorted(
-            [item for sublist in directories.values() for item in sublist], 
-            key=lambda x: (0 if any(x['path'].endswith(ext) for ext in priority_extensions) else 1, x['path'])
-        )
-        
-        for file in sorted_files:
-            file_content = f"\n\nFILE: {file['path']}\n{file['content']}"
-            if total_chars + len(file_content) <= char_limit:
-                important_content += file_content
-                total_chars += len(file_content)
-            else:
-                # Add file path even if content doesn't fit
-                important_content += f"\n\nFILE: {file['path']} (content omitted due to size)"
+        # Most relevant excerpts first, cut to the prompt's token budget
+        if important_content is None:
+            important_content = build_file_context(files, relevance)
         
         # Prepare the prompt
         prompt = f"""
@@ -135,7 +329,7 @@ class IssueMatcher:
         """
         
         try:
-            response = client.chat.completions.create(
+            response = await self.llm_client.chat.completions.create(
                 model="gpt-3.5-turbo-16k",  # Using 16k model for larger context
                 messages=[
                     {"role": "system", "content": "You are an expert code analyst who can understand repositories and explain them concisely."},
@@ -146,76 +340,296 @@ class IssueMatcher:
             return response.choices[0].message.content.strip()
         except Exception as e:
             logging.exception(f"Error generating repository analysis: {e}")
-            return "Failed to generate repository overview due to an error."
+            return OVERVIEW_ERROR
     
-    async def match_files(self, issue_data: Dict, filtered_files: List[Dict]) -> Dict:
+    async def repository_overview(self, files, relevance):
+        """
+        Overview for this exact file set, written from the excerpts most relevant to
+        the issue (`relevance()` maps paths to their similarity to it).
+
+        It is cached under the repository fingerprint plus the set of files whose
+        excerpts made it into the prompt: issues that pick the same excerpts (every
+        issue, when the whole repository fits) share it, and the others get their own.
+        """
+        chosen, omitted = select_excerpts(files, await relevance())
+        important_content = format_file_context(chosen, omitted)
+        if self.overview_cache is None:
+            return await self.analyze_repository(files, important_content=important_content)
+        excerpts = hashlib.sha256('\0'.join(sorted(file['path'] for file in chosen)).encode('utf-8', errors='replace')).hexdigest()
+        key = f"overview:{repository_fingerprint(files)}:{excerpts}"
+        cached = await asyncio.to_thread(self.overview_cache.get, key)
+        if cached is not None:
+            logging.info("Returning cached repository overview")
+            return cached
+        overview = await self.analyze_repository(files, important_content=important_content)
+        if overview != OVERVIEW_ERROR:
+            await asyncio.to_thread(self.overview_cache.set, key, overview)
+        return overview
+
+    async def match_files(self, issue_data: Dict, filtered_files: List[Dict], progress=None) -> Dict:
         """
         Match files to the issue based on similarity scores.
+        `progress(stage, done, total)` is called as pipeline stages advance.
+        """
+        result = {}
+        async for event in self.match_files_events(issue_data, filtered_files):
+            if event['event'] == 'progress' and progress:
+                progress(event['stage'], event['done'], event['total'])
+            elif event['event'] == 'matches':
+                result['filename_matches'] = event['filename_matches']
+            elif event['event'] == 'overview':
+                result['overview'] = event['overview']
+            elif event['event'] == 'error':
+                return {"status": "error", "message": event['message']}
+        return result
+
+    async def match_issues(self, issues: List[Dict], filtered_files: List[Dict], progress=None) -> Dict:
         """
+        Match several issues against the same repository files. The files are downloaded
+        and embedded once, all issues are embedded in one batch and scored with a single
+        matrix product. Returns {"results": [{"filename_matches": [...]}, ...] in issue
+        order, "overview": "..."}.
+        """
+        results = [{} for _ in issues]
+        overview = None
+        async for event in self.match_issues_events(issues, filtered_files):
+            if event['event'] == 'progress' and progress:
+                progress(event['stage'], event['done'], event['total'])
+            elif event['event'] == 'matches':
+                results[event['issue']]['filename_matches'] = event['filename_matches']
+            elif event['event'] == 'overview':
+                overview = event['overview']
+            elif event['event'] == 'error':
+                return {"status": "error", "message": event['message']}
+        return {"results": results, "overview": overview}
+
+    async def match_files_events(self, issue_data: Dict, filtered_files: List[Dict]):
+        """
+        Run the matching pipeline as a stream of events, so callers can show results
+        as soon as they exist:
+
+        - {"event": "progress", "stage": ..., "done": n, "total": m}
+        - {"event": "matches", "issue": 0, "filename_matches": [...]} once scoring is done
+        - {"event": "overview", "overview": "..."} once the LLM answers
+        - {"event": "error", "message": "..."} if anything fails
+        - {"event": "done"} at the end
+        """
+        async for event in self.match_issues_events([issue_data], filtered_files):
+            yield event
+
+    async def match_issues_events(self, issues: List[Dict], filtered_files: List[Dict]):
+        """
+        match_files_events for several issues against one repository: one "matches"
+        event per issue, tagged with its position in `issues`, and one shared overview.
+        """
+        events = asyncio.Queue()
+        task = asyncio.create_task(self._match(issues, filtered_files, events.put_nowait))
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+        finally:
+            # Stop the pipeline if the consumer went away (e.g. the client disconnected)
+            task.cancel()
+
+    async def _match(self, issues, filtered_files, emit):
+        """
+        Body of match_issues_events; reports everything through `emit` and ends with None.
+        All issues must belong to the same repository.
+        """
+        def progress(stage, done, total):
+            emit({"event": "progress", "stage": stage, "done": done, "total": total})
+
+        def emit_matches(i, filename_matches):
+            emit({"event": "matches", "issue": i, "filename_matches": filename_matches})
+
+        overview_task = None
         try:
             # Check cache first
-            cache_key = self.cache.get_cache_key({
-                'issue': issue_data,
-                'files': [f['path'] for f in filtered_files]
-            })
-            
-            cached_result = self.cache.get(cache_key)
-            if cached_result:
+            file_keys = [(f['path'], f.get('sha')) for f in filtered_files]
+            cache_keys = [self.cache.get_cache_key({'issue': issue, 'files': file_keys}) for issue in issues]
+            cached_results = [self.cache.get(key) for key in cache_keys]
+            pending = [i for i, cached_result in enumerate(cached_results) if not cached_result]
+            for i, cached_result in enumerate(cached_results):
+                if cached_result:
+                    emit_matches(i, cached_result['filename_matches'])
+            if not pending:
                 logging.info("Returning cached result")
-                return cached_result
-
-            # Process issue text
-            issue_text = f"{issue_data['title']} {issue_data.get('description', '')}"
-            issue_embedding = self.embedding_generator.generate_embedding(issue_text)
-
-            # Fetch file contents
-            file_contents = await self.fetch_all_files(filtered_files)
-            if not file_contents:
-                logging.warning("No valid files to analyze")
-                return {"status": "error", "message": "No valid files to analyze"}
-
-            # Process files in parallel
-            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-                file_embeddings = list(executor.map(
-                    lambda x: {
-                        'path': x['path'],
-                        'embedding': self.embedding_generator.generate_embedding(
-                            self.preprocess_content(x['content'])
-                        ),
-                        'download_url': x['download_url']
-                    },
-                    file_contents
-                ))
-
-            # Calculate similarities
-            matches = []
-            for file_data in file_embeddings:
-                similarity = self.calculate_similarity(
-                    issue_embedding.cpu().numpy(),
-                    file_data['embedding'].cpu().numpy()
-                )
-                if similarity > 0.1:  # Minimum threshold
-                    matches.append({
-                        "file_name": file_data['path'],
-                        "match_score": round(similarity, 2),
-                        "download_url": file_data['download_url']
-                    })
-
-            # Sort and return results
-            matches.sort(key=lambda x: x['match_score'], reverse=True)
-            result = {
-                "filename_matches": matches[:3]
-            }
-
-            # Generate repository analysis by examining all files
-            file_contents_dict = {file['path']: file['content'] for file in file_contents}
-            overview = self.analyze_repository(file_contents_dict)
-            result["overview"] = overview
-
-            # Cache the result
-            self.cache.set(cache_key, result)
-            return result
+                emit({"event": "overview", "overview": cached_results[0]['overview']})
+                emit({"event": "done"})
+                return
+
+            # Embed the issues while the changed files stream through download -> embed.
+            # Files whose content was embedded before come straight from the store.
+            issue_texts = [f"{issues[i]['title']} {issues[i].get('description', '')}" for i in pending]
+            query_terms = [tokenize(text) for text in issue_texts]
+            issue_task = asyncio.create_task(
+                asyncio.to_thread(self.embedding_generator.generate_embeddings, issue_texts)
+            )
+
+            # Requests for the same repository take turns with its index, from planning
+            # (which drops entries other file sets need) until scoring is done. The next
+            # one in line then finds this one's files already fetched and embedded.
+            index = self.repo_indexes.get(issues[0]['owner'], issues[0]['repo'])
+            async with index.request_lock:
+                # Only fetch files that are new or whose SHA changed since the last request
+                unchanged, to_fetch = index.plan(filtered_files)
+                progress('plan', len(unchanged), len(filtered_files))
+
+                # Large file sets are narrowed down lexically before anything is embedded
+                prefilter = 0 < CONFIG['LEXICAL_CANDIDATES'] < len(filtered_files)
+
+                # The overview only needs file excerpts, so the LLM call starts as soon as
+                # downloads finish and runs alongside embedding and scoring. It keeps its
+                # own references to the entries, since it outlives the request lock.
+                unchanged = {path: index.files[path] for path in unchanged}
+                def start_overview(records):
+                    nonlocal overview_task
+                    fetched = {record['path']: record for record in records}
+                    files = [
+                        dict(fetched[f['path']]) if f['path'] in fetched else dict(unchanged[f['path']], path=f['path'])
+                        for f in filtered_files
+                        if f['path'] in fetched or f['path'] in unchanged
+                    ]
+
+                    async def relevance():
+                        # Best similarity to any of the issues of every file embedded so far;
+                        # files without a vector yet (still embedding, or left out by the
+                        # prefilter) fall back to their scaled BM25 score
+                        issue_embeddings = await issue_task
+                        scores = await asyncio.to_thread(lexical_relevance, files, [term for terms in query_terms for term in terms])
+                        vectors = {
+                            path: entry['embedding']
+                            for entries in (fetched, unchanged)
+                            for path, entry in entries.items()
+                            if 'embedding' in entry
+                        }
+                        if vectors:
+                            similarity = cosine_scores(issue_embeddings, np.stack(list(vectors.values()))).max(axis=1)
+                            scores.update(zip(vectors, similarity.tolist()))
+                        return scores
+
+                    if files:
+                        progress('overview', 0, 1)
+                        overview_task = asyncio.create_task(self.repository_overview(files, relevance))
+
+                if to_fetch:
+                    records = await self.fetch_and_embed(to_fetch, on_fetched=start_overview, progress=progress, embed=not prefilter)
+                else:
+                    records = []
+                    start_overview(records)
+                logging.info(f"Repository index: {len(unchanged)} unchanged, {len(records)} fetched")
+
+                fetched = {record['path'] for record in records}
+                index.remove(f['path'] for f in to_fetch if f['path'] not in fetched)
+                for record in records:
+                    index.update(record.pop('path'), record)
+
+                paths = [f['path'] for f in filtered_files if f['path'] in index.files]
+                if not paths or overview_task is None:
+                    logging.warning("No valid files to analyze")
+                    emit({"event": "error", "message": "No valid files to analyze"})
+                    return
+
+                # BM25 of every file for each issue, scaled so each issue's best file is 1.0
+                lexical = []
+                for terms in query_terms:
+                    scores = index.lexical.scores(terms)
+                    top = max(scores.values(), default=0.0) or 1.0
+                    lexical.append({path: score / top for path, score in scores.items()})
+
+                # Only each issue's best lexical candidates go through the model
+                candidates = paths
+                if prefilter:
+                    chosen = set()
+                    for scores in lexical:
+                        chosen.update(heapq.nlargest(CONFIG['LEXICAL_CANDIDATES'], paths, key=lambda path: scores.get(path, 0.0)))
+                    candidates = [path for path in paths if path in chosen]
+                    logging.info(f"Lexical prefilter: embedding {len(candidates)} of {len(paths)} files")
+                await self.embed_entries(index, candidates, {f['path']: f for f in filtered_files}, progress)
+                # Files whose new download failed are left without a vector
+                candidates = [path for path in candidates if 'embedding' in index.files[path]]
+                if not candidates:
+                    logging.warning("No files could be embedded")
+                    emit({"event": "error", "message": "No valid files to analyze"})
+                    return
+                for record in records:
+                    # Text of files the prefilter passed over isn't kept; it is fetched again if needed
+                    record.pop('chunks', None)
+                issue_embeddings = await issue_task
+                if index.changed:
+                    await asyncio.to_thread(index.save, index.snapshot())
+
+                # On large repositories the IVF index over every embedded file adds each issue's
+                # nearest semantic neighbours to the lexical candidates (without the prefilter,
+                # they replace scanning every file)
+                shortlist_k = max(self.top_k, self.reranker.top_k) if self.reranker else self.top_k
+                if len(paths) >= CONFIG['ANN_MIN_FILES']:
+                    ann = await asyncio.to_thread(index.ann_index)
+                    semantic = {
+                        path
+                        for issue_embedding in issue_embeddings
+                        for path in ann.search(issue_embedding, shortlist_k * 4)[0]
+                    }
+                    lexical_candidates = set(candidates) if prefilter else set()
+                    candidates = [path for path in paths if path in semantic or path in lexical_candidates]
+                    logging.info(f"IVF search: scoring {len(candidates)} of {len(paths)} files, {len(semantic)} from the semantic shortlist")
+
+                # Score the candidates, blending cosine similarity with BM25, and keep the top k:
+                # one matrix product over all issues
+                file_matrix = np.stack([index.files[path]['embedding'] for path in candidates])
+                lexical_matrix = np.array([[scores.get(path, 0.0) for path in candidates] for scores in lexical], dtype=np.float32)
+                matches = [
+                    ([candidates[j] for j in indices], scores)
+                    for indices, scores in cosine_top_k_many(
+                        issue_embeddings, file_matrix, shortlist_k, self.similarity_threshold, lexical_matrix, CONFIG['LEXICAL_WEIGHT']
+                    )
+                ]
+
+                # Optional second stage: a cross-encoder reorders each issue's shortlist
+                if self.reranker is not None:
+                    progress('rerank', 0, len(matches))
+                    matches = [
+                        await asyncio.to_thread(
+                            self.reranker.rerank,
+                            text,
+                            match_paths,
+                            [f"{path}\n{index.files[path].get('excerpt', '')}" for path in match_paths],
+                            scores
+                        )
+                        for text, (match_paths, scores) in zip(issue_texts, matches)
+                    ]
+                    progress('rerank', len(matches), len(matches))
+                matches = [(match_paths[:self.top_k], scores[:self.top_k]) for match_paths, scores in matches]
+
+                results = {}
+                for i, (match_paths, scores) in zip(pending, matches):
+                    results[i] = {
+                        "filename_matches": [
+                            {
+                                "file_name": path,
+                                "match_score": round(float(score), 2),
+                                "download_url": index.files[path]['download_url']
+                            }
+                            for path, score in zip(match_paths, scores)
+                        ]
+                    }
+                    emit_matches(i, results[i]["filename_matches"])
+
+            overview = await overview_task
+            progress('overview', 1, 1)
+            emit({"event": "overview", "overview": overview})
+
+            # Cache the results, unless the overview failed and is worth retrying
+            for i, result in results.items():
+                result["overview"] = overview
+                if overview != OVERVIEW_ERROR:
+                    self.cache.set(cache_keys[i], result)
+            emit({"event": "done"})
 
         except Exception as e:
             logging.exception("Error in match_files")
-            return {"status": "error", "message": str(e)}
\ No newline at end of file
+            emit({"event": "error", "message": str(e)})
+        finally:
+            if overview_task is not None and not overview_task.done():
+                overview_task.cancel()
+            emit(None)
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+import numpy as np
+from .ann import IVFIndex
+from .config import CONFIG
+from .lexical import BM25Index
+
+def blob_sha(content: str) -> str:
+    """
+    Git blob SHA-1 of `content`, the same value GitHub reports as a file's `sha`.
+    """
+    data = content.encode('utf-8', errors='replace')
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+def repository_fingerprint(files) -> str:
+    """
+    Fingerprint of a repository's file set: every path with its content hash.
+    Anything derived only from the files (like the overview) can be cached under it.
+    """
+    digest = hashlib.sha256()
+    for path, sha in sorted((file['path'], file['sha']) for file in files):
+        digest.update(f"{path}\0{sha}\n".encode('utf-8', errors='replace'))
+    return digest.hexdigest()
+
+class EntryStore:
+    """
+    Persistent repository index entries, one SQLite row per (repository, path) holding
+    the entry as JSON without its vector, which the EmbeddingStore keeps. Saving a
+    request's changes only writes the paths it touched.
+    """
+    def __init__(self, path):
+        self.lock = threading.Lock()  # One connection shared by the worker's threads
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries (repo TEXT NOT NULL, path TEXT NOT NULL, entry TEXT NOT NULL, PRIMARY KEY (repo, path))"
+        )
+        self.conn.commit()
+
+    def load(self, repo):
+        with self.lock:
+            rows = self.conn.execute("SELECT path, entry FROM entries WHERE repo = ?", (repo,)).fetchall()
+        return {path: json.loads(entry) for path, entry in rows}
+
+    def write(self, repo, changed, removed):
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO entries (repo, path, entry) VALUES (?, ?, ?)",
+                ((repo, path, json.dumps(entry)) for path, entry in changed.items())
+            )
+            self.conn.executemany("DELETE FROM entries WHERE repo = ? AND path = ?", ((repo, path) for path in removed))
+            self.conn.commit()
+
+class RepositoryIndex:
+    """
+    What we already know about one repository's files: blob SHA, store key,
+    overview excerpt, size, term frequencies and embedding, keyed by path.
+
+    Files the lexical prefilter never picked have no embedding; their text is
+    downloaded again if a later request needs them embedded.
+
+    `plan` drops entries the current request didn't ask for, so a request holds
+    `request_lock` from planning until it has read what it needs from the index.
+    """
+    def __init__(self, owner, repo, entries=None):
+        self.owner = owner
+        self.repo = repo
+        self.key = f"{owner}/{repo}".lower()
+        self.entries = entries  # EntryStore the index is saved to, if any
+        self.files = {}
+        self.changed = set()  # Paths updated or removed since the last snapshot
+        self.ann = None  # IVFIndex over the entries' embeddings, built on first use
+        self.ann_stale = set()  # Paths updated or removed since the IVF index last saw them
+        self.lexical = BM25Index()  # Over every entry's terms, kept in sync by update/remove
+        self.request_lock = asyncio.Lock()
+
+    def plan(self, filtered_files):
+        """
+        Split the requested files into those whose indexed entry is still valid
+        and those that must be (re)fetched, dropping entries for deleted paths.
+        A file is reused only when the request carries its SHA and it matches.
+        """
+        requested = {f['path'] for f in filtered_files}
+        self.remove([p for p in self.files if p not in requested])
+
+        unchanged, to_fetch = [], []
+        for file in filtered_files:
+            entry = self.files.get(file['path'])
+            if entry is not None and file.get('sha') and file['sha'] == entry['sha']:
+                unchanged.append(file['path'])
+            else:
+                to_fetch.append(file)
+        return unchanged, to_fetch
+
+    def update(self, path, entry):
+        self.files[path] = entry
+        self.changed.add(path)
+        if 'terms' in entry:
+            self.lexical.add(path, entry['terms'])
+        if self.ann is not None:
+            self.ann_stale.add(path)
+
+    def remove(self, paths):
+        paths = list(paths)
+        for path in paths:
+            if self.files.pop(path, None) is not None:
+                self.changed.add(path)
+        self.lexical.remove(paths)
+        if self.ann is not None:
+            self.ann_stale.update(paths)
+
+    def ann_index(self) -> IVFIndex:
+        """
+        IVF index over every embedded entry, brought up to date with the entries that
+        changed since its last use and rebuilt once its clustering is stale.
+        Clustering is CPU-heavy: call this from a worker thread, under request_lock.
+        """
+        if self.ann is not None and self.ann_stale:
+            stale, self.ann_stale = self.ann_stale, set()
+            self.ann.remove(stale)
+            added = [path for path in stale if 'embedding' in self.files.get(path, {})]
+            if added:
+                self.ann.add(added, np.stack([self.files[path]['embedding'] for path in added]))
+        if self.ann is None or self.ann.needs_rebuild:
+            self.ann_stale = set()
+            self.ann = IVFIndex()
+            paths = [path for path, entry in self.files.items() if 'embedding' in entry]
+            self.ann.build(paths, np.stack([self.files[path]['embedding'] for path in paths]))
+        return self.ann
+
+    def load(self, store):
+        """
+        Restore the entries saved by `save`, with their vectors from the embedding store
+        when it still has them. Entries made by an older preprocessing version are
+        skipped and will be refetched.
+        """
+        current = f"v{CONFIG['PREPROCESS_VERSION']}-"
+        saved = {path: entry for path, entry in self.entries.load(self.key).items() if entry['key'].startswith(current)}
+        vectors = store.get_many([entry['key'] for entry in saved.values()])
+        for path, entry in saved.items():
+            if entry['key'] in vectors:
+                entry['embedding'] = vectors[entry['key']]
+            self.update(path, entry)
+        self.changed.clear()
+
+    def snapshot(self):
+        """
+        What `save` writes: the entries changed since the last snapshot, without their
+        vector or text chunks, and the paths removed since. Taken on the event loop, so
+        the entries can't change while a worker thread writes them.
+        """
+        changed, self.changed = self.changed, set()
+        saved = {
+            path: {k: v for k, v in self.files[path].items() if k not in ('embedding', 'chunks')}
+            for path in changed if path in self.files
+        }
+        return saved, [path for path in changed if path not in self.files]
+
+    def save(self, snapshot):
+        if self.entries is not None:
+            self.entries.write(self.key, *snapshot)
+
+class RepositoryIndexes:
+    """
+    LRU of per-repository indexes, persisted next to the embedding store when one is configured.
+    """
+    def __init__(self, store=None, directory=CONFIG['REPO_INDEX_DIR'], max_size=CONFIG['REPO_INDEX_MAX_REPOS']):
+        self.store = store
+        self.max_size = max_size
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+        self.entries = None
+        if store is not None and directory:
+            os.makedirs(directory, exist_ok=True)
+            self.entries = EntryStore(os.path.join(directory, 'entries.sqlite3'))
+
+    def get(self, owner, repo) -> RepositoryIndex:
+        key = f"{owner}/{repo}".lower()
+        with self.lock:
+            if key in self.indexes:
+                self.indexes.move_to_end(key)
+                return self.indexes[key]
+            index = RepositoryIndex(owner, repo, self.entries)
+            if self.entries is not None:
+                index.load(self.store)
+            if len(self.indexes) >= self.max_size:
+                self.indexes.popitem(last=False)
+            self.indexes[key] = index
+            return index
@@ -0,0 +1,66 @@
+import logging
+import time
+import numpy as np
+from .backends import detect_device
+
+class Reranker:
+    """
+    Second retrieval stage: a cross-encoder reads the issue together with each of the
+    bi-encoder's best candidates (path plus excerpt) and reorders them.
+
+    It only runs on the first `top_k` candidates, is skipped when the bi-encoder's
+    best score already leads the runner-up by `margin`, and stops scoring once
+    `budget` seconds are spent; candidates it didn't reach keep their order after
+    the reranked ones.
+
+    The cross-encoder only decides the order: every candidate keeps its first-stage
+    score, so reported scores stay on one scale whether or not it reached them.
+    """
+    def __init__(self, model_name, top_k=20, margin=0.15, budget=0.5, batch_size=8):
+        self.model_name = model_name
+        self.top_k = top_k
+        self.margin = margin
+        self.budget = budget
+        self.batch_size = batch_size
+        self.model = None  # Lazy load the model
+
+    def get_model(self):
+        if self.model is None:
+            from sentence_transformers import CrossEncoder
+            self.model = CrossEncoder(self.model_name, device=detect_device())
+        return self.model
+
+    def warm_up(self):
+        self.get_model().predict([("warm up", "warm up")])
+
+    def rerank(self, query, candidates, texts, scores):
+        """
+        Reorder `candidates` (best first, with first-stage `scores`) by cross-encoder
+        relevance of `texts` to `query`. Returns (candidates, scores), each candidate
+        still with its first-stage score.
+        """
+        candidates, texts = list(candidates), list(texts)
+        scores = np.asarray(scores, dtype=np.float32)
+        if len(candidates) < 2 or scores[0] - scores[1] >= self.margin:
+            return candidates, scores
+
+        model = self.get_model()
+        shortlist = min(len(candidates), self.top_k)
+        deadline = time.monotonic() + self.budget
+        relevance = []
+        for start in range(0, shortlist, self.batch_size):
+            end = min(start + self.batch_size, shortlist)
+            relevance.extend(model.predict(
+                [(query, text) for text in texts[start:end]],
+                batch_size=end - start,
+                show_progress_bar=False,
+            ).tolist())
+            if time.monotonic() >= deadline:
+                break
+        if len(relevance) < shortlist:
+            logging.info(f"Rerank budget spent after {len(relevance)} of {shortlist} candidates")
+
+        # Whatever activation the model applies is monotonic, so it can't change the order
+        order = list(np.argsort(-np.asarray(relevance, dtype=np.float32), kind='stable'))
+        order += range(len(relevance), len(candidates))
+        return [candidates[i] for i in order], scores[order]
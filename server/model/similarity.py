@@ -0,0 +1,53 @@
+import numpy as np
+
+def normalize(vectors):
+    """
+    L2-normalize rows (or a single vector) so cosine similarity becomes a dot product.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def top_k(scores, k, threshold=None):
+    """
+    Return the indices of the k highest scores (best first), skipping any at or
+    below `threshold`. Uses a partial sort so cost stays linear in len(scores).
+    """
+    scores = np.asarray(scores)
+    if threshold is not None:
+        candidates = np.flatnonzero(scores > threshold)
+    else:
+        candidates = np.arange(len(scores))
+    if len(candidates) > k:
+        candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+def cosine_scores(query, matrix):
+    """
+    Cosine similarity of `query` with every row of `matrix`, as one matrix-vector product.
+    `query` may also be a stack of vectors, giving one column of scores per query.
+    """
+    return normalize(matrix) @ normalize(query).T
+
+def fuse_scores(semantic, lexical, weight):
+    """
+    Blend cosine scores with lexical scores already scaled to [0, 1].
+    """
+    if lexical is None or weight <= 0:
+        return semantic
+    return (1 - weight) * semantic + weight * np.asarray(lexical, dtype=np.float32)
+
+def cosine_top_k_many(queries, matrix, k, threshold=None, lexical=None, lexical_weight=0.0):
+    """
+    Top k matches in `matrix` for every row of `queries`, scored with a single matrix
+    product and blended with `lexical` (queries x rows, in [0, 1]) by `lexical_weight`.
+    Returns one (indices, scores) pair per query.
+    """
+    if len(matrix) == 0 or k <= 0:
+        return [(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)) for _ in queries]
+    scores = fuse_scores(cosine_scores(np.atleast_2d(queries), matrix).T, lexical, lexical_weight)
+    results = []
+    for row in scores:
+        indices = top_k(row, k, threshold)
+        results.append((indices, row[indices]))
+    return results
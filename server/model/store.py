@@ -0,0 +1,126 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import numpy as np
+from .config import CONFIG
+
+def content_key(content: str, version=CONFIG['PREPROCESS_VERSION']) -> str:
+    """
+    Build the store key for a file: its content hash plus the preprocessing version.
+    """
+    digest = hashlib.sha256(content.encode('utf-8', errors='replace')).hexdigest()
+    return f"v{version}-{digest}"
+
+class EmbeddingStore:
+    """
+    Persistent content-addressed embeddings for one model.
+
+    Vectors live in an append-only float16 file read through np.memmap, so several
+    workers share them through the page cache. A SQLite table maps keys to rows:
+    lookups and writes only touch the keys involved, and SQLite's write lock
+    serializes appends across processes.
+    """
+    QUERY_CHUNK = 500  # Keys per lookup, well under SQLite's bound-parameter limit
+
+    def __init__(self, directory, model_name):
+        self.directory = os.path.join(directory, model_name.replace('/', '__'))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, 'vectors.f16')
+        self.lock = threading.Lock()  # One connection shared by the worker's threads
+        self.conn = sqlite3.connect(
+            os.path.join(self.directory, 'index.sqlite3'),
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None,  # Transactions are managed explicitly in put_many
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")  # Readers don't block the writer
+        self.conn.execute("CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        self.rows = {}  # Rows looked up so far; a key's row never changes once written
+        self.dim = self._meta('dim')
+        self.vectors = None
+        self.mapped_rows = 0
+
+    def _meta(self, name):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def _lookup(self, keys):
+        """
+        Fill self.rows for `keys` that are stored, querying only keys not seen yet.
+        """
+        unknown = [key for key in dict.fromkeys(keys) if key not in self.rows]
+        for start in range(0, len(unknown), self.QUERY_CHUNK):
+            chunk = unknown[start:start + self.QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            self.rows.update(self.conn.execute(f"SELECT key, row FROM rows WHERE key IN ({placeholders})", chunk))
+
+    def _matrix(self, needed_rows):
+        """
+        Memmap covering at least `needed_rows` rows, remapped only when other
+        processes have appended past what is mapped.
+        """
+        if self.vectors is None or needed_rows > self.mapped_rows:
+            self.mapped_rows = os.path.getsize(self.vectors_path) // (self.dim * 2)
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float16, mode='r', shape=(self.mapped_rows, self.dim))
+        return self.vectors
+
+    def get_many(self, keys):
+        """
+        Return {key: float32 vector} for every key already in the store.
+        """
+        with self.lock:
+            self._lookup(keys)
+            found = {key: self.rows[key] for key in keys if key in self.rows}
+            if not found:
+                return {}
+            if self.dim is None:
+                self.dim = self._meta('dim')
+            matrix = self._matrix(max(found.values()) + 1)
+            return {key: np.asarray(matrix[row], dtype=np.float32) for key, row in found.items()}
+
+    def put_many(self, keys, vectors):
+        """
+        Append vectors for keys that are not stored yet.
+        """
+        vectors = np.asarray(vectors, dtype=np.float16)
+        with self.lock:
+            self._lookup(keys)
+            new_rows = {}
+            for key, vector in zip(keys, vectors):
+                if key not in self.rows and key not in new_rows:
+                    new_rows[key] = vector
+            if not new_rows:
+                return
+
+            self.conn.execute("BEGIN IMMEDIATE")  # Exclusive writer across processes
+            try:
+                # Another process may have stored some of the keys meanwhile
+                self._lookup(new_rows)
+                new_rows = {key: vector for key, vector in new_rows.items() if key not in self.rows}
+                self.dim = self._meta('dim')
+                if self.dim is None:
+                    self.dim = vectors.shape[1]
+                    self.conn.execute("INSERT INTO meta (name, value) VALUES ('dim', ?)", (self.dim,))
+                count = self.conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM rows").fetchone()[0]
+
+                if new_rows:
+                    # Drop any tail left by a writer that died before committing its rows
+                    mode = 'r+b' if os.path.exists(self.vectors_path) else 'w+b'
+                    with open(self.vectors_path, mode) as f:
+                        f.truncate(count * self.dim * 2)
+                        f.seek(0, os.SEEK_END)
+                        f.write(np.stack(list(new_rows.values())).astype(np.float16).tobytes())
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self.conn.executemany(
+                        "INSERT INTO rows (key, row) VALUES (?, ?)",
+                        ((key, count + offset) for offset, key in enumerate(new_rows))
+                    )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            for offset, key in enumerate(new_rows):
+                self.rows[key] = count + offset
@@ -0,0 +1,26 @@
+import logging
+from functools import lru_cache
+
+try:
+    import tiktoken  # Optional: exact counts for OpenAI models
+except ImportError:
+    tiktoken = None
+
+@lru_cache(maxsize=None)
+def _encoding(name):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:  # The BPE file is downloaded on first use
+        logging.warning(f"tiktoken encoding {name} unavailable, estimating token counts: {e}")
+        return None
+
+def count_tokens(text: str, encoding='cl100k_base') -> int:
+    """
+    Number of LLM tokens in `text`: exact with tiktoken, otherwise ~4 characters per token.
+    """
+    enc = _encoding(encoding)
+    if enc is None:
+        return len(text) // 4 + 1
+    return len(enc.encode(text, disallowed_special=()))
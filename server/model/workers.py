@@ -0,0 +1,223 @@
+import collections
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+import numpy as np
+import torch.multiprocessing as mp
+
+def _worker_main(model, loader, conn, in_name, max_batch, threads):
+    """
+    Worker process: report the model's dimension, tokenizer and max_seq_length, open
+    the output buffer the pool sizes from the dimension, then wait for (offsets) of a batch written to the input buffer,
+    encode it, write the vectors to the output buffer and answer None (or the
+    error message).
+    """
+    import torch
+    torch.set_num_threads(threads)
+    if loader is not None:
+        model = loader()
+    dim = model.get_sentence_embedding_dimension()
+    conn.send((dim, model.tokenizer, model.max_seq_length))
+    in_shm = shared_memory.SharedMemory(name=in_name)
+    out_shm = shared_memory.SharedMemory(name=conn.recv())
+    out = np.ndarray((max_batch, dim), dtype=np.float32, buffer=out_shm.buf)
+    try:
+        while (offsets := conn.recv()) is not None:
+            data = bytes(in_shm.buf[:offsets[-1]])
+            texts = [data[a:b].decode('utf-8', errors='ignore') for a, b in zip(offsets, offsets[1:])]
+            try:
+                out[:len(texts)] = model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+                conn.send(None)
+            except Exception as e:
+                conn.send(repr(e))
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        del out
+        in_shm.close()
+        out_shm.close()
+
+class _Request:
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+
+class _Worker:
+    """One worker process plus its input/output buffers and the pipe that drives it"""
+    def __init__(self, ctx, model, loader, max_batch, text_bytes, threads):
+        self.max_batch = max_batch
+        self.text_bytes = text_bytes
+        self.in_shm = shared_memory.SharedMemory(create=True, size=max_batch * text_bytes)
+        self.out_shm = None
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(model if loader is None else None, loader, child_conn, self.in_shm.name, max_batch, threads),
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def connect(self):
+        """Wait for the worker's model to load and create the output buffer it asks for"""
+        try:
+            self.dim, self.tokenizer, self.max_seq_length = self.conn.recv()
+        except EOFError:
+            self.process.join(timeout=5)
+            raise RuntimeError(f"Embedding worker exited with code {self.process.exitcode} while loading the model")
+        self.out_shm = shared_memory.SharedMemory(create=True, size=self.max_batch * self.dim * 4)
+        self.out = np.ndarray((self.max_batch, self.dim), dtype=np.float32, buffer=self.out_shm.buf)
+        self.conn.send(self.out_shm.name)
+
+    def encode(self, texts):
+        offsets = [0]
+        for text in texts:
+            data = text.encode('utf-8')[:self.text_bytes]
+            self.in_shm.buf[offsets[-1]:offsets[-1] + len(data)] = data
+            offsets.append(offsets[-1] + len(data))
+        self.conn.send(offsets)
+        error = self.conn.recv()
+        if error is not None:
+            raise RuntimeError(f"Embedding worker failed: {error}")
+        return self.out[:len(texts)].copy()
+
+    def close(self):
+        try:
+            self.conn.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        shms = [self.in_shm]
+        if self.out_shm is not None:
+            del self.out
+            shms.append(self.out_shm)
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+class EmbeddingWorkerPool:
+    """
+    Run a SentenceTransformer in a pool of spawned worker processes, so encoding
+    scales across cores instead of contending for the API process's GIL.
+
+    - Torch weights are moved to shared memory once (`share_memory()`), so this pool's
+      workers map the API process's copy instead of loading their own.
+    - Texts and vectors travel through per-worker shared-memory buffers; the pipe only
+      carries offsets and an ack.
+    - Concurrent `encode` calls are queued and merged into batches of up to `max_batch`
+      texts, waiting at most `batch_wait` seconds for more work to arrive.
+
+    Models whose weights can't be mapped that way (quantized or ONNX backends) are
+    instead built in each worker by the picklable `loader`, and `model` is None: the API
+    process never loads them, but every worker holds a full copy. Workers report the
+    embedding dimension once their model is loaded.
+
+    The pool belongs to one API process and nothing is shared between pools, so a host
+    running N uvicorn workers holds N torch models (or N x `workers` quantized/ONNX
+    ones) and N x `workers` encoding processes. With EMBEDDING_PROCESSES enabled, run a
+    single API worker per host and size `workers` to its cores instead.
+    """
+    def __init__(self, model=None, workers=4, max_batch=64, batch_wait=0.005, text_bytes=16 * 1024, loader=None):
+        if model is None and loader is None:
+            raise ValueError("EmbeddingWorkerPool needs a model or a loader")
+        self.model = model
+        self.loader = loader
+        self.workers = workers
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait
+        self.text_bytes = text_bytes  # Longer texts are cut; the model reads far less anyway
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._threads = []
+        self._workers = []
+        self._closed = False
+        self.dim = None  # Embedding dimension, reported by the workers on start
+        self.tokenizer = None  # The model's tokenizer and max_seq_length, likewise
+        self.max_seq_length = None
+
+    def start(self):
+        if self._workers:
+            return
+        ctx = mp.get_context('spawn')
+        if self.loader is None:
+            self.model.share_memory()
+        threads = max(1, (os.cpu_count() or 1) // self.workers)
+        # Start every process first so their models load in parallel
+        workers = [_Worker(ctx, self.model, self.loader, self.max_batch, self.text_bytes, threads) for _ in range(self.workers)]
+        try:
+            for worker in workers:
+                worker.connect()
+        except Exception:
+            for worker in workers:
+                worker.close()
+            raise
+        self.dim, self.tokenizer, self.max_seq_length = workers[0].dim, workers[0].tokenizer, workers[0].max_seq_length
+        for worker in workers:
+            thread = threading.Thread(target=self._serve, args=(worker,), daemon=True)
+            thread.start()
+            self._workers.append(worker)
+            self._threads.append(thread)
+        logging.info(f"Started {self.workers} embedding worker processes")
+
+    def encode(self, texts):
+        """Embed `texts` (in order) and return a float32 matrix; safe to call from many threads"""
+        self.start()
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        requests = [_Request(texts[i:i + self.max_batch]) for i in range(0, len(texts), self.max_batch)]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Embedding worker pool is closed")
+            self._pending.extend(requests)
+            self._cond.notify_all()
+        return np.concatenate([request.future.result() for request in requests])
+
+    def _next_batch(self):
+        """Take the next request plus whatever else fits in one batch"""
+        with self._cond:
+            while not self._pending and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return None
+            batch = [self._pending.popleft()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.batch_wait
+            while True:
+                while self._pending and size + len(self._pending[0].texts) <= self.max_batch:
+                    batch.append(self._pending.popleft())
+                    size += len(batch[-1].texts)
+                remaining = deadline - time.monotonic()
+                if size >= self.max_batch or self._pending or remaining <= 0:
+                    return batch
+                self._cond.wait(remaining)
+
+    def _serve(self, worker):
+        while (batch := self._next_batch()) is not None:
+            try:
+                vectors = worker.encode([text for request in batch for text in request.texts])
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+            start = 0
+            for request in batch:
+                request.future.set_result(vectors[start:start + len(request.texts)])
+                start += len(request.texts)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            pending, self._pending = list(self._pending), collections.deque()
+            self._cond.notify_all()
+        for request in pending:
+            request.future.set_exception(RuntimeError("Embedding worker pool is closed"))
+        for thread in self._threads:
+            thread.join()
+        for worker in self._workers:
+            worker.close()
+        self._threads, self._workers = [], []
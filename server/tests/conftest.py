@@ -0,0 +1,47 @@
+import contextlib
+import os
+import re
+import sys
+import pytest
+from aiohttp import web
+
+# Tests run from server/ like the app does: `python -m pytest tests`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+from model.config import CONFIG
+
+@contextlib.asynccontextmanager
+async def serve(app: web.Application):
+    """Run `app` on a free local port and yield its base URL"""
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        await runner.cleanup()
+
+@pytest.fixture
+def config(monkeypatch, tmp_path):
+    """CONFIG with every on-disk cache disabled; tests override what they need"""
+    monkeypatch.setitem(CONFIG, "EMBEDDING_STORE_DIR", "")
+    monkeypatch.setitem(CONFIG, "OVERVIEW_CACHE_PATH", "")
+    monkeypatch.setitem(CONFIG, "HTTP_CACHE_DIR", "")
+    monkeypatch.setitem(CONFIG, "REPO_INDEX_DIR", str(tmp_path / "repositories"))
+    return CONFIG
+
+class PieceTokenizer:
+    """Stands in for a model tokenizer: every 4 characters of a word are one token, plus [CLS]/[SEP]"""
+    def num_special_tokens_to_add(self, pair=False):
+        return 2
+
+    def __call__(self, text, add_special_tokens=True, return_offsets_mapping=False, verbose=True):
+        offsets = [
+            (start, min(start + 4, match.end()))
+            for match in re.finditer(r'\S+', text)
+            for start in range(match.start(), match.end(), 4)
+        ]
+        return {"input_ids": list(range(len(offsets))), "offset_mapping": offsets}
@@ -0,0 +1,125 @@
+import asyncio
+import io
+import tarfile
+import aiohttp
+from aiohttp import web
+from conftest import serve
+from model.limits import ByteBudget
+from model.archive import fetch_archive
+from model.matcher import IssueMatcher
+
+MEMBERS = {
+    "a.py": b"def a():\n    return 1\n",
+    "b.py": b"def b():\n    return 2\n",
+    "unrequested.py": b"def c():\n    return 3\n",
+    "logo.png": b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR",
+    "big.txt": b"x" * 5000,
+}
+REQUESTED = ["a.py", "b.py", "logo.png", "big.txt", "missing.py"]
+
+def make_tarball():
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        directory = tarfile.TarInfo("repo-main/")
+        directory.type = tarfile.DIRTYPE
+        tar.addfile(directory)
+        for path, data in MEMBERS.items():
+            info = tarfile.TarInfo(f"repo-main/{path}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+def requested_files():
+    return [
+        {"path": path, "sha": None, "download_url": f"https://raw.githubusercontent.com/owner/repo/main/{path}"}
+        for path in REQUESTED
+    ]
+
+def archive_app(requests):
+    tarball = make_tarball()
+
+    async def tar_gz(request):
+        requests.append(request.path)
+        return web.Response(body=tarball, content_type="application/x-gzip")
+
+    app = web.Application()
+    app.router.add_get("/{owner}/{repo}/tar.gz/{ref}", tar_gz)
+    return app
+
+def drain(queue):
+    records = {}
+    while not queue.empty():
+        record = queue.get_nowait()
+        if record is not None:
+            records[record["path"]] = record
+    return records
+
+def test_fetch_archive_delivers_requested_text_files(config, monkeypatch):
+    monkeypatch.setitem(config, "MAX_FILE_BYTES", 1024)
+    requests = []
+
+    async def run():
+        async with serve(archive_app(requests)) as url, aiohttp.ClientSession() as session:
+            monkeypatch.setitem(config, "ARCHIVE_BASE_URL", url)
+            queue = asyncio.Queue()
+            delivered = await fetch_archive(session, requested_files(), queue, ByteBudget())
+            return delivered, drain(queue)
+
+    delivered, records = asyncio.run(run())
+    assert requests == ["/owner/repo/tar.gz/main"]
+    # Binary members count as delivered so they are not downloaded again one by one
+    assert delivered == {"a.py", "b.py", "logo.png", "big.txt"}
+    assert set(records) == {"a.py", "b.py", "big.txt"}
+    assert records["a.py"]["content"] == MEMBERS["a.py"].decode()
+    assert records["a.py"]["download_url"] == "https://raw.githubusercontent.com/owner/repo/main/a.py"
+    assert len(records["big.txt"]["content"]) == 1024
+    assert records["big.txt"]["size"] == 5000
+
+def test_fetch_files_falls_back_to_per_file_downloads(config, monkeypatch):
+    monkeypatch.setitem(config, "ARCHIVE_MIN_FILES", 1)
+    downloads = []
+
+    async def download_file_content(session, file, budget=None):
+        downloads.append(file["path"])
+        return None
+
+    async def run():
+        async with serve(archive_app([])) as url, aiohttp.ClientSession() as session:
+            monkeypatch.setitem(config, "ARCHIVE_BASE_URL", url)
+            matcher = IssueMatcher(session=session)
+            monkeypatch.setattr(matcher, "download_file_content", download_file_content)
+            queue = asyncio.Queue()
+            await matcher.fetch_files(requested_files(), queue)
+            return drain(queue)
+
+    records = asyncio.run(run())
+    assert set(records) == {"a.py", "b.py", "big.txt"}
+    assert downloads == ["missing.py"]
+
+def test_fetch_archive_failure_delivers_nothing(config, monkeypatch):
+    async def run():
+        app = web.Application()
+        async with serve(app) as url, aiohttp.ClientSession() as session:  # Every path is a 404
+            monkeypatch.setitem(config, "ARCHIVE_BASE_URL", url)
+            queue = asyncio.Queue()
+            return await fetch_archive(session, requested_files(), queue), queue.qsize()
+
+    assert asyncio.run(run()) == (set(), 0)
+
+def test_fetch_archive_charges_downloaded_bytes_to_the_budget(config, monkeypatch):
+    tarball_size = len(make_tarball())
+
+    async def run(limit):
+        async with serve(archive_app([])) as url, aiohttp.ClientSession() as session:
+            monkeypatch.setitem(config, "ARCHIVE_BASE_URL", url)
+            budget = ByteBudget(limit)
+            delivered = await fetch_archive(session, requested_files(), asyncio.Queue(), budget)
+            return delivered, budget
+
+    delivered, budget = asyncio.run(run(10 * tarball_size))
+    assert len(delivered) == 4
+    assert budget.remaining == 9 * tarball_size
+
+    delivered, budget = asyncio.run(run(tarball_size // 4))
+    assert budget.exhausted
+    assert len(delivered) < 4
@@ -0,0 +1,28 @@
+from conftest import PieceTokenizer
+from model.matcher import IssueMatcher
+
+class TokenizerOnly:
+    def get_tokenizer(self):
+        return PieceTokenizer(), 10  # 8 tokens of text per window
+
+def chunks(config, content, chunk_max=8):
+    config["CHUNK_MAX"] = chunk_max
+    matcher = IssueMatcher(llm_client=object())
+    matcher.embedding_generator = TokenizerOnly()
+    return matcher.preprocess_chunks(content)
+
+def test_windows_hold_as_many_tokens_as_the_model_reads(config):
+    tokenizer = PieceTokenizer()
+    result = chunks(config, "Parse_Configuration files for every environment at startup, a b")
+
+    assert result == ["parse_configuration files for", "every environment at startup,", "a b"]
+    for chunk in result:
+        assert len(tokenizer(chunk)["input_ids"]) <= 8
+
+def test_long_files_stop_after_chunk_max_windows(config):
+    result = chunks(config, "word " * 1000, chunk_max=3)
+
+    assert result == [" ".join(["word"] * 8)] * 3
+
+def test_empty_file_has_one_empty_window(config):
+    assert chunks(config, "") == [""]
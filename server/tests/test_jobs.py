@@ -0,0 +1,200 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.core.jobs import CANCELLED, FAILED, QUEUED, RUNNING, SUCCEEDED, JobManager, SQLiteJobStore
+from app.routers import jobs
+
+class FakeMatcher:
+    """Stands in for IssueMatcher: reports each stage, then waits `delay` seconds"""
+    def __init__(self):
+        self.delay = 0
+        self.started = []
+
+    async def match_files(self, issue_data, filtered_files, progress=None):
+        self.started.append(issue_data["title"])
+        for stage in ("plan", "fetch", "embed"):
+            progress(stage, len(filtered_files), len(filtered_files))
+        await asyncio.sleep(self.delay)
+        return {"filename_matches": [{"file_name": "a.py", "match_score": 0.9, "download_url": "https://example.com/a.py"}], "overview": "ok"}
+
+def make_client(workers=1, max_queued=10, retention=3600):
+    matcher = FakeMatcher()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.matcher = matcher
+        app.state.jobs = JobManager(jobs.job_handlers(matcher), SQLiteJobStore(":memory:"), workers, max_queued, retention)
+        app.state.jobs.start()
+        yield
+        await app.state.jobs.close()
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(jobs.router, prefix="/api/jobs")
+    return TestClient(app), matcher
+
+def issue_request(title="Crash on start"):
+    return {
+        "owner": "owner",
+        "repo": "repo",
+        "filteredFiles": [{"name": "a.py", "path": "a.py", "download_url": "https://example.com/a.py"}],
+        "issueDetails": {"owner": "owner", "repo": "repo", "title": title, "description": "It crashes", "labels": [], "issuenum": 7},
+    }
+
+def wait_for(client, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"Job {job_id} never reached {statuses}: {job}")
+
+def test_submit_poll_and_fetch_result():
+    client, matcher = make_client()
+    with client:
+        response = client.post("/api/jobs/match-keywords", json=issue_request())
+        assert response.status_code == 202
+        job = response.json()
+        assert job["status"] == QUEUED
+        assert job["status_url"] == f"/api/jobs/{job['job_id']}"
+
+        job = wait_for(client, job["job_id"], {SUCCEEDED})
+        assert job["progress"] == {stage: {"done": 1, "total": 1} for stage in ("plan", "fetch", "embed")}
+        result = client.get(f"/api/jobs/{job['job_id']}/result").json()
+        assert result["overview"] == "ok"
+        assert result["issuenum"] == 7
+        assert result["repo"] == "repo"
+
+def test_result_of_unfinished_job_is_a_conflict():
+    client, matcher = make_client()
+    matcher.delay = 30
+    with client:
+        job_id = client.post("/api/jobs/match-keywords", json=issue_request()).json()["job_id"]
+        wait_for(client, job_id, {RUNNING})
+        response = client.get(f"/api/jobs/{job_id}/result")
+        assert response.status_code == 409
+        assert client.get("/api/jobs/unknown").status_code == 404
+
+def test_cancel_running_and_queued_jobs():
+    client, matcher = make_client(workers=1)
+    matcher.delay = 30
+    with client:
+        running = client.post("/api/jobs/match-keywords", json=issue_request("first")).json()["job_id"]
+        wait_for(client, running, {RUNNING})
+        queued = client.post("/api/jobs/match-keywords", json=issue_request("second")).json()["job_id"]
+        assert client.get(f"/api/jobs/{queued}").json()["status"] == QUEUED
+
+        assert client.delete(f"/api/jobs/{queued}").json()["status"] == CANCELLED
+        client.delete(f"/api/jobs/{running}")
+        assert wait_for(client, running, {CANCELLED})["finished_at"] is not None
+
+        # The worker is free again and skips the cancelled job it finds on the queue
+        matcher.delay = 0
+        third = client.post("/api/jobs/match-keywords", json=issue_request("third")).json()["job_id"]
+        wait_for(client, third, {SUCCEEDED})
+        assert matcher.started == ["first", "third"]
+        assert client.get(f"/api/jobs/{queued}/result").status_code == 409
+
+def test_full_queue_answers_429():
+    client, matcher = make_client(workers=1, max_queued=1)
+    matcher.delay = 30
+    with client:
+        running = client.post("/api/jobs/match-keywords", json=issue_request()).json()["job_id"]
+        wait_for(client, running, {RUNNING})
+        assert client.post("/api/jobs/match-keywords", json=issue_request()).status_code == 202
+        assert client.post("/api/jobs/match-keywords", json=issue_request()).status_code == 429
+
+async def wait_until(manager, job_id, statuses, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = await manager.get(job_id)
+        if job is not None and job.status in statuses:
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Job {job_id} never reached {statuses}")
+
+def test_finished_jobs_are_purged_after_retention():
+    async def run():
+        async def work(payload, job):
+            return "done"
+
+        manager = JobManager({"test": work}, SQLiteJobStore(":memory:"), workers=1, retention=0.2)
+        manager.start()
+        job = await manager.submit("test", {})
+        await wait_until(manager, job.id, {SUCCEEDED})
+        await asyncio.sleep(0.3)
+        expired = await manager.get(job.id)
+        await manager.close()
+        return expired
+
+    assert asyncio.run(run()) is None
+
+def test_failed_work_marks_the_job_failed():
+    async def run():
+        async def work(payload, job):
+            raise RuntimeError("no files")
+
+        manager = JobManager({"test": work}, SQLiteJobStore(":memory:"), workers=1)
+        manager.start()
+        job = await manager.submit("test", {})
+        job = await wait_until(manager, job.id, {FAILED})
+        await manager.close()
+        return job
+
+    job = asyncio.run(run())
+    assert job.status == FAILED
+    assert job.error == "no files"
+
+def test_processes_sharing_a_store_see_each_others_jobs(tmp_path):
+    async def run():
+        ran_by = []
+
+        def handlers(name):
+            async def work(payload, job):
+                ran_by.append(name)
+                return {"echo": payload["value"]}
+            return {"test": work}
+
+        path = str(tmp_path / "jobs.sqlite3")
+        accepting = JobManager(handlers("accepting"), SQLiteJobStore(path), workers=0)
+        running = JobManager(handlers("running"), SQLiteJobStore(path), workers=1)
+        accepting.start()
+        running.start()
+        job = await accepting.submit("test", {"value": 3})
+        job = await wait_until(accepting, job.id, {SUCCEEDED})
+        await accepting.close()
+        await running.close()
+        return job, ran_by
+
+    job, ran_by = asyncio.run(run())
+    assert job.result == {"echo": 3}
+    assert ran_by == ["running"]
+
+def test_jobs_interrupted_by_shutdown_run_after_restart(tmp_path):
+    async def run():
+        attempts = []
+
+        async def work(payload, job):
+            attempts.append(job.id)
+            if len(attempts) == 1:
+                await asyncio.sleep(30)
+            return "done"
+
+        path = str(tmp_path / "jobs.sqlite3")
+        before = JobManager({"test": work}, SQLiteJobStore(path), workers=1)
+        before.start()
+        job = await before.submit("test", {})
+        await wait_until(before, job.id, {RUNNING})
+        await before.close()
+
+        after = JobManager({"test": work}, SQLiteJobStore(path), workers=1)
+        after.start()
+        job = await wait_until(after, job.id, {SUCCEEDED})
+        await after.close()
+        return job, attempts
+
+    job, attempts = asyncio.run(run())
+    assert job.result == "done"
+    assert attempts == [job.id, job.id]
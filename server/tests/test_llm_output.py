@@ -0,0 +1,45 @@
+import json
+import pytest
+from model.llm_output import GraphResponseParser, parse_graph, repair_json
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": 1}\n```', {"a": 1}),
+    ('{"a": 1, // note\n "b": /* inline */ 2}', {"a": 1, "b": 2}),
+    ("{'a': 'it\\'s'}", {"a": "it's"}),
+    ('{"a": "two\nlines"}', {"a": "two\nlines"}),
+    ('{"a": [1, 2,], }', {"a": [1, 2]}),
+    ('{"a": True, "b": None}', {"a": True, "b": None}),
+    ('{nodes: [], edges: []}', {"nodes": [], "edges": []}),
+    ('{"a": {"b": [1, 2', {"a": {"b": [1, 2]}}),
+    ('{"a": "cut', {"a": "cut"}),
+    ('["a", "b', ["a", "b"]),
+])
+def test_repair_json(text, expected):
+    assert json.loads(repair_json(text)) == expected
+
+@pytest.mark.parametrize("text", ['{"a": 1, "b', '{"a": 1, "b":', '{"a": 1, "b": ', '{"a": 1, b', '{"a": 1, "b": tr'])
+def test_repair_drops_member_cut_off_before_its_value(text):
+    assert json.loads(repair_json(text)) == {"a": 1}
+
+def test_parse_graph_leaves_valid_json_alone():
+    assert parse_graph(' {"nodes": ["//not a comment"]} ') == {"nodes": ["//not a comment"]}
+    with pytest.raises(ValueError):
+        parse_graph("[1, 2]")
+
+def test_parser_handles_markers_split_across_chunks():
+    text = 'noise ---JSON_GRAPH--- {"nodes": []} ---JSON_END---\n---DESCRIPTION--- Parses config. ---DESCRIPTION_END---'
+    parser = GraphResponseParser()
+    for start in range(0, len(text), 3):
+        parser.feed(text[start:start + 3])
+    assert parser.close() == {"description": "Parses config.", "graph": {"nodes": []}}
+
+def test_parser_closes_truncated_response():
+    parser = GraphResponseParser()
+    parser.feed('---JSON_GRAPH--- {"nodes": [{"id": "a"}], "edges')
+    assert parser.close() == {"description": "No description available", "graph": {"nodes": [{"id": "a"}]}}
+
+def test_parser_requires_graph():
+    parser = GraphResponseParser()
+    parser.feed("no markers here")
+    with pytest.raises(ValueError):
+        parser.close()
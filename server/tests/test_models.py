@@ -0,0 +1,87 @@
+import json
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.routers import models
+
+MATCH = {"file_name": "a.py", "match_score": 0.9, "download_url": "https://example.com/a.py"}
+
+class FakeMatcher:
+    """Stands in for IssueMatcher: one match per issue, or an error result when `fail` is set"""
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.batches = []
+
+    async def match_issues(self, issues, filtered_files, progress=None):
+        self.batches.append([issue["title"] for issue in issues])
+        if self.fail:
+            return {"status": "error", "message": "embedding failed"}
+        return {"results": [{"filename_matches": [MATCH]} for _ in issues], "overview": "ok"}
+
+    async def match_files_events(self, issue_data, filtered_files, progress=None):
+        yield {"event": "progress", "stage": "fetch", "done": len(filtered_files), "total": len(filtered_files)}
+        yield {"event": "matches", "issue": 0, "filename_matches": [MATCH]}
+        yield {"event": "overview", "overview": "ok"}
+        yield {"event": "done"}
+
+def make_client(matcher):
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.matcher = matcher
+        yield
+
+    app = FastAPI(lifespan=lifespan)
+    app.include_router(models.router, prefix="/api/models")
+    return TestClient(app)
+
+FILES = [{"name": "a.py", "path": "a.py", "download_url": "https://example.com/a.py"}]
+
+def issue(title, repo="repo", issuenum=7):
+    return {"owner": "owner", "repo": repo, "title": title, "description": f"{title} details", "labels": [], "issuenum": issuenum}
+
+def test_batch_returns_matches_per_issue():
+    matcher = FakeMatcher()
+    with make_client(matcher) as client:
+        response = client.post("/api/models/match-keywords/batch", json={
+            "owner": "owner", "repo": "repo", "filteredFiles": FILES,
+            "issues": [issue("Crash", issuenum=1), issue("Hang", issuenum=2)],
+        })
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "results": [
+            {"filename_matches": [MATCH], "description": "Crash details", "issuenum": 1},
+            {"filename_matches": [MATCH], "description": "Hang details", "issuenum": 2},
+        ],
+        "overview": "ok",
+        "repo": "repo",
+        "owner": "owner",
+    }
+    assert matcher.batches == [["Crash", "Hang"]]
+
+def test_batch_rejects_other_repositories_and_reports_errors():
+    matcher = FakeMatcher(fail=True)
+    with make_client(matcher) as client:
+        mixed = client.post("/api/models/match-keywords/batch", json={
+            "owner": "owner", "repo": "repo", "filteredFiles": FILES, "issues": [issue("Crash", repo="other")],
+        })
+        failed = client.post("/api/models/match-keywords/batch", json={
+            "owner": "owner", "repo": "repo", "filteredFiles": FILES, "issues": [issue("Crash")],
+        })
+
+    assert mixed.status_code == 400
+    assert matcher.batches == [["Crash"]]  # Only the valid batch reached the matcher
+    assert failed.status_code == 500
+    assert "embedding failed" in failed.json()["detail"]
+
+def test_stream_sends_one_json_event_per_line():
+    with make_client(FakeMatcher()) as client:
+        response = client.post("/api/models/match-keywords/stream", json={
+            "owner": "owner", "repo": "repo", "filteredFiles": FILES, "issueDetails": issue("Crash"),
+        })
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event["event"] for event in events] == ["progress", "matches", "overview", "done"]
+    assert events[1]["filename_matches"] == [MATCH]
@@ -0,0 +1,125 @@
+import asyncio
+import time
+import numpy as np
+from aiohttp import web
+from openai import AsyncOpenAI
+from conftest import PieceTokenizer, serve
+from model.matcher import OVERVIEW_ERROR, IssueMatcher
+from model.repo_index import repository_fingerprint
+
+EMBED_SECONDS = 0.5
+LLM_SECONDS = 0.5
+
+class SlowEmbeddingGenerator:
+    """Deterministic vectors; file embedding takes EMBED_SECONDS and records when it ran"""
+    store = None
+    store_name = "fake"
+
+    def __init__(self):
+        self.file_embedding = None
+
+    def get_tokenizer(self):
+        return PieceTokenizer(), 18
+
+    def vector(self, text):
+        rng = np.random.default_rng(sum(text.encode()))
+        vector = rng.standard_normal(8).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def generate_embeddings(self, texts, keys=None):
+        return np.stack([self.vector(text) for text in texts])
+
+    def generate_document_embeddings(self, documents, keys=None):
+        start = time.monotonic()
+        time.sleep(EMBED_SECONDS)
+        self.file_embedding = (start, time.monotonic())
+        return np.stack([self.vector(" ".join(chunks)) for chunks in documents])
+
+def stand_in_app(calls, fail=False):
+    """Raw files under /raw/ and an OpenAI-compatible chat completions endpoint"""
+    async def raw(request):
+        return web.Response(text=f"def {request.match_info['name']}():\n    return 'parse the config file'\n")
+
+    async def completions(request):
+        calls.append(time.monotonic())
+        await asyncio.sleep(LLM_SECONDS)
+        if fail:
+            return web.json_response({"error": {"message": "overloaded"}}, status=500)
+        return web.json_response({
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": "gpt-3.5-turbo-16k",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "  A config parser.  "},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    app = web.Application()
+    app.router.add_get("/raw/{name}", raw)
+    app.router.add_post("/v1/chat/completions", completions)
+    return app
+
+ISSUE = {"owner": "owner", "repo": "repo", "title": "Config parsing fails", "description": "The config file is not parsed"}
+
+def files(url):
+    return [
+        {"path": f"src/file{i}.py", "sha": f"sha{i}", "download_url": f"{url}/raw/file{i}"}
+        for i in range(5)
+    ]
+
+def cached_overviews(matcher, requested):
+    prefix = f"overview:{repository_fingerprint(requested)}:"
+    keys = [key for (key,) in matcher.overview_cache.conn.execute("SELECT key FROM entries")]
+    return [matcher.overview_cache.get(key) for key in keys if key.startswith(prefix)]
+
+async def match(config, tmp_path, calls, fail=False, runs=1, issues=None):
+    config["OVERVIEW_CACHE_PATH"] = str(tmp_path / "overviews.sqlite3")
+    async with serve(stand_in_app(calls, fail)) as url:
+        matcher = IssueMatcher(llm_client=AsyncOpenAI(base_url=f"{url}/v1", api_key="test", max_retries=0))
+        matcher.embedding_generator = SlowEmbeddingGenerator()
+        results = []
+        for issue in issues or [ISSUE] * runs:
+            results.append(await matcher.match_files(issue, files(url)))
+        return matcher, files(url), results
+
+def test_overview_runs_alongside_embedding(config, tmp_path):
+    calls = []
+    matcher, requested, [result] = asyncio.run(match(config, tmp_path, calls))
+
+    assert result["overview"] == "A config parser."
+    assert result["filename_matches"]
+    embed_start, embed_end = matcher.embedding_generator.file_embedding
+    assert len(calls) == 1
+    assert calls[0] < embed_end  # The LLM was asked while files were still embedding
+    assert cached_overviews(matcher, requested) == ["A config parser."]
+
+def test_failed_overview_is_reported_and_not_cached(config, tmp_path):
+    calls = []
+    matcher, requested, results = asyncio.run(match(config, tmp_path, calls, fail=True, runs=2))
+
+    for result in results:
+        assert result["overview"] == OVERVIEW_ERROR
+        assert result["filename_matches"]
+    assert len(calls) == 2  # Neither the overview nor the matches were cached
+    assert cached_overviews(matcher, requested) == []
+
+def test_overview_is_shared_by_issues_that_pick_the_same_excerpts(config, tmp_path):
+    calls = []
+    other = dict(ISSUE, title="Logging is too verbose", description="Too many debug lines")
+    matcher, requested, results = asyncio.run(match(config, tmp_path, calls, issues=[ISSUE, other]))
+
+    assert [result["overview"] for result in results] == ["A config parser."] * 2
+    assert len(calls) == 1  # Every excerpt fits the budget, so both issues use the same overview
+
+def test_overview_is_keyed_by_the_chosen_excerpts(config, tmp_path):
+    calls = []
+    config["OVERVIEW_CONTEXT_TOKENS"] = 40  # Room for only some of the excerpts
+    other = dict(ISSUE, title="Logging is too verbose", description="Too many debug lines")
+    matcher, requested, results = asyncio.run(match(config, tmp_path, calls, issues=[ISSUE, other]))
+
+    assert len(calls) == 2  # The issues rank different files first
+    assert cached_overviews(matcher, requested) == ["A config parser."] * 2